@@ -3,25 +3,25 @@ from __future__ import annotations
 
 import async_timeout
 import logging
-import json
-import asyncio
 
 from datetime import timedelta
 from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry, ConfigType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
+from .connection import MomentConnection
 from .const import (
     DOMAIN,
+    DATA_CONNECTIONS,
     CONF_HOST,
     CONF_PORT,
     PLATFORMS
 )
 
-SIZE = 1024
 UPDATE_INTERVAL = 3
+PUSH_FALLBACK_INTERVAL = 60
 TIMEOUT_INTERVAL = 10
 
 _LOGGER = logging.getLogger(__name__)
@@ -31,7 +31,7 @@ async def async_setup(
     config: ConfigType
 ) -> bool:
     """Set up lightme integration component."""
-    hass.data.setdefault(DOMAIN, {})
+    hass.data.setdefault(DOMAIN, {DATA_CONNECTIONS: {}})
     return True
 
 async def async_setup_entry(
@@ -52,7 +52,16 @@ async def async_setup_entry(
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+
+    if unload_ok:
+        host = entry.data.get(CONF_HOST, "127.0.0.1")
+        hass.data[DOMAIN].pop(host, None)
+        connection = hass.data[DOMAIN][DATA_CONNECTIONS].pop(host, None)
+        if connection is not None:
+            await connection.async_close()
+
+    return unload_ok
 
 async def get_coordinator(
     hass: HomeAssistant,
@@ -65,56 +74,56 @@ async def get_coordinator(
     if hass.data[DOMAIN].get(host):
         return hass.data[DOMAIN][host]
 
-    async def run_client(host: str, port: int):
-        # 서버와의 연결을 생성합니다.
-        reader: asyncio.StreamReader
-        writer: asyncio.StreamWriter
-        reader, writer = await asyncio.open_connection(host, port)
-
-        # show connection info
-        print("[C] connected")
-
-        # 루프를 돌면서 입력받은 내용을 서버로 보내고,
-        # 응답을 받으면 출력합니다.
-        line = ("Capstone gogo")
-
-        # 입력받은 내용을 서버로 전송
-        payload = line.encode()
-        writer.write(payload)
-        await writer.drain()
-        print(f"[C] sent: {len(payload)} bytes.\n")
-
-        # 서버로부터 받은 응답을 표시
-        data = await reader.read(1024)  # type: bytes
-        print(f"[C] received: {len(data)} bytes")
-        print(f"[C] message: {data.decode()}")
-        if data is not None:
-            result = json.loads(data)
-            return result
+    # 호스트당 하나의 연결을 유지하며 재사용합니다.
+    connection: MomentConnection = hass.data[DOMAIN][DATA_CONNECTIONS].setdefault(
+        host, MomentConnection(host, port)
+    )
 
     async def async_get_data():
         try:
             async with async_timeout.timeout(TIMEOUT_INTERVAL):
-                return await run_client(host, port)
+                data = await connection.async_request({"type": "get"})
         except Exception as exc:
+            coordinator.update_interval = timedelta(seconds=UPDATE_INTERVAL)
             raise UpdateFailed(f"LightMe error: {exc}") from exc
 
+        # push 수신 중이면 polling 은 연결 확인용으로만 드물게 수행합니다.
+        coordinator.update_interval = timedelta(
+            seconds=PUSH_FALLBACK_INTERVAL if connection.subscribed else UPDATE_INTERVAL
+        )
+        return data
+
+    @callback
+    def async_on_event(data: Any) -> None:
+        # 센서가 상황 변화를 push 하면 바로 반영합니다.
+        coordinator.update_interval = timedelta(seconds=PUSH_FALLBACK_INTERVAL)
+        coordinator.async_set_updated_data(data)
+
+    @callback
+    def async_on_disconnect() -> None:
+        # push 가 끊기면 polling 으로 돌아갑니다.
+        coordinator.update_interval = timedelta(seconds=UPDATE_INTERVAL)
+        hass.async_create_task(coordinator.async_request_refresh())
+
     # hass.data{
     #   "lightme": {
     #       "127.0.0.1": {
     #           coordinator
-    # }
+    #       },
+    #       "connections": {
+    #           "127.0.0.1": MomentConnection
+    #       }
     # }
     # }
     # coordinator data: 전체
-    hass.data[DOMAIN][host] = DataUpdateCoordinator(
+    coordinator = hass.data[DOMAIN][host] = DataUpdateCoordinator(
         hass,
         _LOGGER,
         name=DOMAIN,
         update_method=async_get_data,
         update_interval=timedelta(seconds=UPDATE_INTERVAL)
     )
-    _coordinator: DataUpdateCoordinator = hass.data[DOMAIN][host]
-    await _coordinator.async_refresh()
+    connection.async_add_listener(async_on_event, async_on_disconnect)
+    await coordinator.async_refresh()
 
     return hass.data[DOMAIN][host]
@@ -0,0 +1,198 @@
+"""Persistent connection to a lightme moment sensor."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from . import protocol
+
+_LOGGER = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 5
+BACKOFF_MIN = 1
+BACKOFF_MAX = 60
+
+
+class MomentConnection:
+    """One long-lived stream to a moment sensor, shared by all requests.
+
+    Requests are framed messages (see protocol.py) tagged with an id, and the
+    sensor echoes that id in its reply, so any number of requests can be
+    in flight on the same stream. A dropped stream is reopened on the next
+    request, waiting with exponential backoff between failed attempts.
+
+    While listeners are registered, every new stream is subscribed to push
+    events, which the sensor sends whenever its moment changes.
+    """
+
+    def __init__(self, host: str, port: int, codec: int = protocol.CODEC_JSON) -> None:
+        """Initializer."""
+        self.host = host
+        self.port = port
+        self.codec = codec
+
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._subscribe_task: asyncio.Task | None = None
+        self._connect_lock = asyncio.Lock()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._listeners: list[Callable[[Any], None]] = []
+        self._disconnect_listeners: list[Callable[[], None]] = []
+        self._subscribed = False
+
+        self._backoff = BACKOFF_MIN
+        self._retry_at = 0.0
+
+    @property
+    def connected(self) -> bool:
+        """Return True while the stream is open."""
+        return self._writer is not None
+
+    @property
+    def subscribed(self) -> bool:
+        """Return True while the sensor pushes events on this stream."""
+        return self._subscribed
+
+    def async_add_listener(
+        self,
+        on_event: Callable[[Any], None],
+        on_disconnect: Callable[[], None] | None = None
+    ) -> Callable[[], None]:
+        """Listen for pushed events; return a function removing the listener."""
+        self._listeners.append(on_event)
+        if on_disconnect is not None:
+            self._disconnect_listeners.append(on_disconnect)
+
+        def remove_listener() -> None:
+            self._listeners.remove(on_event)
+            if on_disconnect is not None:
+                self._disconnect_listeners.remove(on_disconnect)
+
+        return remove_listener
+
+    async def async_request(self, message: dict[str, Any]) -> Any:
+        """Send a request and return the data of its reply."""
+        await self._async_ensure_connected()
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        try:
+            try:
+                self._writer.write(protocol.encode([{"id": request_id, **message}], self.codec))
+                await self._writer.drain()
+            except OSError as exc:
+                self._disconnect(exc)
+                raise ConnectionError(f"Lost connection to {self.host}:{self.port}") from exc
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def async_close(self) -> None:
+        """Close the stream and drop the listeners."""
+        self._listeners.clear()
+        self._disconnect_listeners.clear()
+        writer = self._writer
+        self._disconnect(ConnectionError("Connection closed"))
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _async_ensure_connected(self) -> None:
+        """Open the stream unless it is open or a retry is not due yet."""
+        if self.connected:
+            return
+
+        async with self._connect_lock:
+            if self.connected:
+                return
+
+            now = time.monotonic()
+            if now < self._retry_at:
+                raise ConnectionError(
+                    f"Reconnecting to {self.host}:{self.port} in {self._retry_at - now:.0f} s"
+                )
+
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError) as exc:
+                self._retry_at = now + self._backoff
+                self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+                raise ConnectionError(
+                    f"Cannot connect to {self.host}:{self.port}: {exc}"
+                ) from exc
+
+            _LOGGER.debug("Connected to %s:%s", self.host, self.port)
+            self._backoff = BACKOFF_MIN
+            self._retry_at = 0.0
+            self._read_task = asyncio.create_task(self._async_read_loop(self._reader))
+
+            if self._listeners:
+                self._subscribe_task = asyncio.create_task(self._async_subscribe())
+
+    async def _async_subscribe(self) -> None:
+        """Switch the current stream to push mode."""
+        try:
+            data = await self.async_request({"type": "subscribe"})
+        except ConnectionError as exc:
+            _LOGGER.debug("Subscribe to %s:%s failed: %s", self.host, self.port, exc)
+            return
+
+        self._subscribed = True
+        self._dispatch(data)
+
+    def _dispatch(self, data: Any) -> None:
+        """Hand pushed data to the listeners."""
+        for listener in list(self._listeners):
+            listener(data)
+
+    async def _async_read_loop(self, reader: asyncio.StreamReader) -> None:
+        """Route replies to the requests waiting for them."""
+        try:
+            while True:
+                _, messages = await protocol.async_read_messages(reader)
+                for message in messages:
+                    if message.get("type") == "event":
+                        self._dispatch(message.get("data"))
+                        continue
+
+                    future = self._pending.get(message.get("id"))
+                    if future is not None and not future.done():
+                        future.set_result(message.get("data"))
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            if self._reader is reader:
+                self._disconnect(exc)
+
+    def _disconnect(self, exc: Exception) -> None:
+        """Drop the stream and fail every request still waiting on it."""
+        if self._read_task is not None and self._read_task is not asyncio.current_task():
+            self._read_task.cancel()
+
+        was_subscribed = self._subscribed
+        if self._writer is not None:
+            _LOGGER.debug("Disconnected from %s:%s: %s", self.host, self.port, exc)
+            self._writer.close()
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._subscribed = False
+
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(str(exc)))
+
+        if was_subscribed:
+            for listener in list(self._disconnect_listeners):
+                listener()
@@ -9,5 +9,7 @@ SW_VERSION = "1.0.0"
 
 PLATFORMS: list[Platform] = [Platform.SENSOR]
 
+DATA_CONNECTIONS = "connections"
+
 CONF_HOST = "host"
 CONF_PORT = "port"
@@ -0,0 +1,139 @@
+"""Moment sensor wire protocol.
+
+Every frame is a fixed header followed by a payload:
+
+    version (1 byte) | codec (1 byte) | payload length (4 bytes, big-endian)
+
+The payload is a list of messages (dicts) encoded with the codec named in
+the header, so several messages can share a frame. Compact JSON is always
+available; msgpack is used only if the package is installed.
+
+The same module lives in vision/final and core/lightme; keep both copies
+in sync.
+"""
+from __future__ import annotations
+
+import json
+import struct
+import traceback
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+HEADER = struct.Struct("!BBI")
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+
+class ProtocolError(ValueError):
+    """Malformed or unsupported frame."""
+
+
+def encode(messages: list[dict[str, Any]], codec: int = CODEC_JSON) -> bytes:
+    """Return one frame carrying messages."""
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ProtocolError("msgpack is not installed")
+        payload = msgpack.packb(messages, use_bin_type=True)
+    elif codec == CODEC_JSON:
+        payload = json.dumps(messages, separators=(",", ":"), ensure_ascii=False).encode()
+    else:
+        raise ProtocolError(f"Unknown codec {codec}")
+
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return HEADER.pack(VERSION, codec, len(payload)) + payload
+
+
+def parse_header(header) -> tuple[int, int]:
+    """Return (codec, payload length) of a frame header."""
+    version, codec, length = HEADER.unpack_from(header)
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {length} bytes exceeds {MAX_PAYLOAD}")
+    return codec, length
+
+
+def decode_payload(codec: int, payload) -> list[dict[str, Any]]:
+    """Return the messages of a frame payload (bytes or memoryview)."""
+    if codec == CODEC_JSON:
+        messages = json.loads(str(payload, "utf-8"))
+    elif codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ProtocolError("msgpack is not installed")
+        messages = msgpack.unpackb(payload, raw=False)
+    else:
+        raise ProtocolError(f"Unknown codec {codec}")
+
+    if not isinstance(messages, list):
+        raise ProtocolError("Frame payload is not a message list")
+    return messages
+
+
+class FrameDecoder:
+    """Incremental decoder for a byte stream split at arbitrary points.
+
+    Received bytes are appended to one buffer and complete frames are
+    decoded in place through a memoryview; the consumed prefix is dropped
+    once per feed().
+
+    A frame that fails to decode is dropped along with the frames before
+    it in the same feed() before the error is raised, so later calls go
+    on with the next frame. A bad header leaves no frame boundary to go
+    on from, so it drops the whole buffer.
+    """
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self._buffer = bytearray()
+        self.codec = CODEC_JSON
+
+    def feed(self, data: bytes) -> list[dict[str, Any]]:
+        """Add received bytes and return the messages now complete."""
+        self._buffer += data
+        messages: list[dict[str, Any]] = []
+        offset = 0
+        error: ValueError | None = None
+
+        with memoryview(self._buffer) as view:
+            while len(view) - offset >= HEADER.size:
+                try:
+                    codec, length = parse_header(view[offset:offset + HEADER.size])
+                except ProtocolError as exc:
+                    error, offset = exc, len(view)
+                    break
+                end = offset + HEADER.size + length
+                if len(view) < end:
+                    break
+
+                try:
+                    messages.extend(decode_payload(codec, view[offset + HEADER.size:end]))
+                except ValueError as exc:
+                    error = exc
+                offset = end
+                if error is not None:
+                    break
+                self.codec = codec
+
+        if error is not None:
+            # The traceback holds a view of the payload, which blocks resizing
+            traceback.clear_frames(error.__traceback__)
+        if offset:
+            del self._buffer[:offset]
+        if error is not None:
+            raise error
+        return messages
+
+
+async def async_read_messages(reader) -> tuple[int, list[dict[str, Any]]]:
+    """Read one frame from an asyncio StreamReader; return (codec, messages)."""
+    codec, length = parse_header(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(length)
+    return codec, decode_payload(codec, payload)
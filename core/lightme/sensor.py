@@ -86,4 +86,7 @@ class MomentSensor(CoordinatorEntity, SensorEntity) :
     @property
     def state(self) -> StateType:
         """Return the state of the sensor."""
+        # 센서가 아직 상황을 알리지 않았으면 data 는 None 입니다.
+        if self.coordinator.data is None:
+            return None
         return self.coordinator.data.get(self.description.key) #[self.description.key]
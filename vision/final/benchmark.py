@@ -0,0 +1,348 @@
+"""Micro-benchmarks for the moment sensor pipeline.
+
+Run from the vision directory, e.g. ``python -m final.benchmark nms``.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from .detector import BACKENDS, create_detector
+from .features import NUM_LANDMARKS, NUM_VALUES, pose_features
+from .posture import classify_posture, classify_postures
+from .recorder import Recording
+from .ring import FRAME_SHAPE, RING_SLOTS, SharedFrameRing
+from .yolo import Detections, nms
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "data")
+
+
+def _timeit(func, repeat: int) -> float:
+    """Return the best wall time of func over repeat runs in ms."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def synthetic_detections(
+    count: int,
+    width: int = 640,
+    height: int = 480,
+    seed: int = 0
+) -> Detections:
+    """Return count dense, heavily overlapping detections.
+
+    Boxes are jittered around a handful of centres the way YOLO reports
+    the same object from neighbouring grid cells in a crowded scene.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform((0, 0), (width, height), size=(max(1, count // 20), 2))
+    picks = centres[rng.integers(0, len(centres), size=count)]
+    sizes = rng.uniform(20, 120, size=(count, 2))
+    xy = picks + rng.normal(0, 6, size=(count, 2)) - sizes / 2
+
+    return Detections(
+        np.hstack((xy, sizes)).astype(np.int32),
+        rng.uniform(0.5, 1.0, size=count).astype(np.float32),
+        rng.integers(0, 80, size=count).astype(np.int32)
+    )
+
+
+def bench_nms(count: int, repeat: int) -> None:
+    """Compare the old membership scan with direct NMS indexing."""
+    detections = synthetic_detections(count)
+    indexes = nms(detections)
+    raw = np.asarray(indexes).reshape(-1, 1)
+
+    def membership():
+        return [
+            detections.boxes[i]
+            for i in range(len(detections))
+            if i in raw
+        ]
+
+    def direct():
+        return detections.take(indexes)
+
+    print(f"nms: {count} boxes, {len(indexes)} kept")
+    print(f"  nms             {_timeit(lambda: nms(detections), repeat):8.3f} ms")
+    print(f"  'i in indexes'  {_timeit(membership, repeat):8.3f} ms")
+    print(f"  direct index    {_timeit(direct, repeat):8.3f} ms")
+
+
+def bench_postures(count: int, repeat: int) -> None:
+    """Compare classifying stored landmarks frame by frame and all at once."""
+    landmarks = np.random.default_rng(0).random((count, NUM_LANDMARKS, NUM_VALUES), dtype=np.float32)
+
+    def per_frame():
+        motion = "-"
+        for features in pose_features(landmarks):
+            motion = classify_posture(features, motion)
+
+    print(f"postures: {count} frames of landmarks")
+    print(f"  per frame       {_timeit(per_frame, max(1, repeat // 10)):10.3f} ms")
+    print(f"  batched         {_timeit(lambda: classify_postures(landmarks), repeat):10.3f} ms")
+
+
+def bench_replay(path: str, repeat: int) -> None:
+    """Replay a recording through the pipeline decision logic."""
+    from .pipeline import MomentPipeline
+
+    recording = Recording(path)
+    print(f"replay: {len(recording)} frames in {len(recording.segments)} segments of {path}")
+
+    start = time.perf_counter()
+    samples = list(recording)
+    print(f"  load            {(time.perf_counter() - start) * 1000:10.3f} ms")
+
+    mismatches = []
+
+    def replay():
+        mismatches.append(MomentPipeline("replay").replay(samples))
+
+    replay_ms = _timeit(replay, repeat)
+    fps = len(samples) / replay_ms * 1000 if replay_ms else 0.0
+    print(f"  decide          {replay_ms:10.3f} ms  {fps:10.0f} fps  "
+          f"{mismatches[-1]} moments differ from the recording")
+    print(f"  postures        {_timeit(lambda: classify_postures(recording.landmarks), repeat):10.3f} ms")
+
+
+def read_frames(path: str, limit: int) -> list[np.ndarray]:
+    """Return up to limit decoded frames of a video."""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def bench_backends(
+    names: list[str],
+    weights: dict[str, str],
+    image_path: str,
+    video_path: str,
+    frames: int,
+    repeat: int,
+    roi_size: int | None = None
+) -> None:
+    """Compare detector backends on a still image and a video clip.
+
+    With roi_size, each backend is also timed at that input size on the
+    centre of the image, as the pipeline does around the person.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(image_path)
+    clip = read_frames(video_path, frames)
+
+    print(f"backends: {os.path.basename(image_path)}, "
+          f"{len(clip)} frames of {os.path.basename(video_path)}")
+
+    for name in names:
+        detector = create_detector(name, weights=weights.get(name))
+        try:
+            start = time.perf_counter()
+            detector.load()
+            load_ms = (time.perf_counter() - start) * 1000
+        except (ImportError, OSError, cv2.error) as exc:
+            print(f"  {name:12s} unavailable: {exc}")
+            continue
+
+        detections = detector.detect(image)
+        image_ms = _timeit(lambda: detector.detect(image), repeat)
+
+        start = time.perf_counter()
+        for frame in clip:
+            detector.detect(frame)
+        video_s = time.perf_counter() - start
+        fps = len(clip) / video_s if video_s else 0.0
+
+        print(f"  {name:12s} load {load_ms:8.1f} ms  image {image_ms:8.2f} ms "
+              f"({len(detections)} objects)  video {fps:6.1f} fps")
+
+        if roi_size:
+            height, width = image.shape[:2]
+            roi = (width // 4, height // 4, width // 2, height // 2)
+            roi_detector = create_detector(name, weights=weights.get(name), input_size=roi_size)
+            detections = roi_detector.detect(image, roi)
+            roi_ms = _timeit(lambda: roi_detector.detect(image, roi), repeat)
+            print(f"  {'':12s} roi {roi[2]}x{roi[3]} at {roi_size}  image {roi_ms:8.2f} ms "
+                  f"({len(detections)} objects)")
+
+
+def _queue_producer(frames: mp.Queue, count: int, shape: tuple[int, int, int]) -> None:
+    """Send count frames through a multiprocessing queue."""
+    frame = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    for _ in range(count):
+        frames.put(frame)
+    frames.put(None)
+
+
+def _ring_producer(
+    name: str, lock: mp.Lock, taken, count: int, shape: tuple[int, int, int], slots: int
+) -> None:
+    """Write count frames into a shared frame ring.
+
+    With taken, a shared counter of the last sequence number the consumer
+    read, each frame waits until the consumer read it so none is
+    dropped; without it frames are written as fast as possible.
+    """
+    frame = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    with SharedFrameRing.attach(name, lock, shape, slots) as ring:
+        for _ in range(count):
+            seq = ring.put(frame)
+            while taken is not None and taken.value < seq:
+                time.sleep(0)
+        ring.mark_closed()
+
+
+def _delivery(received: int, first: float | None, last: float) -> str:
+    """Return the rate frames reached the consumer after the first one."""
+    if received < 2:
+        return f"{received:5d} delivered"
+    elapsed = last - first
+    return (
+        f"{received:5d} delivered  {(received - 1) / elapsed:8.1f} fps  "
+        f"{elapsed / (received - 1) * 1000:6.3f} ms/frame"
+    )
+
+
+def bench_ring(count: int, shape: tuple[int, int, int], slots: int) -> None:
+    """Compare handing frames to another process by queue and by frame ring.
+
+    A producer process writes count frames while this process reads one
+    pixel of each. Rates are measured at the consumer, from the first
+    frame received to the last, so they count only frames delivered.
+
+    The queue and the lockstep ring deliver every frame: the queue holds
+    at most slots frames and the producer waits on it, the ring producer
+    waits until the previous frame was read. The lockstep consumer spins
+    on the ring head, yielding the CPU, instead of polling, so it
+    measures the hand-off alone. The latest-only ring is how the pipeline reads: the producer
+    never waits and the consumer polls for the newest frame, so frames
+    written between two reads are dropped.
+    """
+    context = mp.get_context("spawn")
+    print(f"ring: {count} frames of {shape[1]}x{shape[0]}, {slots} slots")
+
+    frames = context.Queue(maxsize=slots)
+    producer = context.Process(target=_queue_producer, args=(frames, count, shape))
+    producer.start()
+    received, first, last = 0, None, 0.0
+    while (frame := frames.get()) is not None:
+        received += int(frame[0, 0, 0] >= 0)
+        last = time.perf_counter()
+        first = first or last
+    producer.join()
+    print(f"  queue (pickled)      {_delivery(received, first, last)}")
+
+    with SharedFrameRing.create(shape, slots) as ring:
+        taken = context.RawValue("q", 0)
+        producer = context.Process(
+            target=_ring_producer, args=(ring.name, ring.lock, taken, count, shape, slots)
+        )
+        producer.start()
+        received, first, last = 0, None, 0.0
+        while True:
+            while ring.seq == taken.value and ring.running:
+                time.sleep(0)
+            frame = ring.latest(timeout=0)
+            if frame is None:
+                break
+            received += int(frame.bgr[0, 0, 0] >= 0)
+            last = time.perf_counter()
+            first = first or last
+            taken.value = frame.seq
+        del frame
+        producer.join()
+        print(f"  shared ring lockstep {_delivery(received, first, last)}")
+
+    with SharedFrameRing.create(shape, slots) as ring:
+        producer = context.Process(
+            target=_ring_producer, args=(ring.name, ring.lock, None, count, shape, slots)
+        )
+        producer.start()
+        received, first, last = 0, None, 0.0
+        while (frame := ring.latest()) is not None:
+            received += int(frame.bgr[0, 0, 0] >= 0)
+            last = time.perf_counter()
+            first = first or last
+        del frame
+        producer.join()
+        print(f"  shared ring latest   {_delivery(received, first, last)}, {ring.dropped} dropped")
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the selected benchmark."""
+    parser = argparse.ArgumentParser(prog="python -m final.benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    nms_parser = sub.add_parser("nms", help="NMS post-processing")
+    nms_parser.add_argument("--boxes", type=int, nargs="+", default=[100, 500, 2000])
+
+    backend_parser = sub.add_parser("backends", help="detector backends")
+    backend_parser.add_argument(
+        "--backend", dest="backends", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS)
+    )
+    backend_parser.add_argument(
+        "--weights", nargs="*", default=[], metavar="BACKEND=PATH",
+        help="model path per backend, e.g. tflite=./checkpoints/yolov4-tiny-416.tflite"
+    )
+    backend_parser.add_argument("--image", default=os.path.join(DATA_DIR, "kite.jpg"))
+    backend_parser.add_argument("--video", default=os.path.join(DATA_DIR, "road.mp4"))
+    backend_parser.add_argument("--frames", type=int, default=100)
+    backend_parser.add_argument("--roi-size", type=int, help="also time a centre crop at this input size")
+
+    postures_parser = sub.add_parser("postures", help="posture classification")
+    postures_parser.add_argument("--frames", type=int, nargs="+", default=[1000, 86400])
+
+    replay_parser = sub.add_parser("replay", help="decision logic on a recording")
+    replay_parser.add_argument("path", help="directory written with --record-dir")
+
+    ring_parser = sub.add_parser("ring", help="frame hand-off between processes")
+    ring_parser.add_argument("--frames", type=int, default=2000)
+    ring_parser.add_argument("--size", default=f"{FRAME_SHAPE[1]}x{FRAME_SHAPE[0]}", metavar="WxH")
+    ring_parser.add_argument("--slots", type=int, default=RING_SLOTS)
+
+    args = parser.parse_args(argv)
+
+    if args.bench == "nms":
+        for count in args.boxes:
+            bench_nms(count, args.repeat)
+
+    elif args.bench == "backends":
+        weights = dict(item.split("=", 1) for item in args.weights)
+        bench_backends(
+            args.backends, weights, args.image, args.video, args.frames, args.repeat, args.roi_size
+        )
+
+    elif args.bench == "postures":
+        for count in args.frames:
+            bench_postures(count, args.repeat)
+
+    elif args.bench == "replay":
+        bench_replay(args.path, args.repeat)
+
+    elif args.bench == "ring":
+        width, _, height = args.size.partition("x")
+        bench_ring(args.frames, (int(height), int(width), 3), args.slots)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
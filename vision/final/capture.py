@@ -0,0 +1,156 @@
+"""Capture stage for the moment sensor."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from .frame import FrameBuffer
+
+_LOGGER = logging.getLogger(__name__)
+
+RING_SIZE = 2
+
+
+class CaptureStage:
+    """Grab frames on a dedicated thread into a bounded ring buffer.
+
+    Every tick reads the camera exactly once. Consumers always receive the
+    newest frame (latest-frame-wins); frames nobody asked for in time fall
+    off the ring and are counted as dropped.
+    """
+
+    def __init__(self, source=0, size: int = RING_SIZE):
+        """Initializer."""
+        self.source = source
+        self._ring: deque[FrameBuffer] = deque(maxlen=max(1, size))
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._capture = None
+        self._running = False
+        self._last_seq = 0
+
+        self.captured = 0
+        self.dropped = 0
+
+    def __enter__(self) -> CaptureStage:
+        """Start capturing."""
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        """Stop capturing."""
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        """Return True while the capture thread delivers frames."""
+        return self._running
+
+    def start(self) -> CaptureStage:
+        """Open the source and start the capture thread."""
+        if self._running:
+            return self
+
+        if isinstance(self.source, cv2.VideoCapture):
+            self._capture = self.source
+        else:
+            self._capture = cv2.VideoCapture(self.source)
+
+        if not self._capture.isOpened():
+            raise RuntimeError(f"Cannot open video source {self.source!r}")
+
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="capture", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the capture thread and release the source."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def latest(self, timeout: float | None = None) -> FrameBuffer | None:
+        """Return the newest frame not yet handed out.
+
+        Blocks until a new frame arrives, the timeout expires or the
+        capture stops. Returns None in the latter two cases.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: not self._running or (
+                    self._ring and self._ring[-1].seq > self._last_seq
+                ),
+                timeout=timeout
+            ):
+                return None
+
+            if not self._ring or self._ring[-1].seq <= self._last_seq:
+                return None
+
+            frame = self._ring[-1]
+            self.dropped += frame.seq - self._last_seq - 1
+            self._last_seq = frame.seq
+            return frame
+
+    def _run(self) -> None:
+        """Read the camera once per tick."""
+        seq = 0
+        while self._running:
+            ret, img = self._capture.read()
+            timestamp = time.monotonic()
+
+            if not ret:
+                _LOGGER.info("Video source %r ended", self.source)
+                break
+
+            seq += 1
+            frame = FrameBuffer(img, seq=seq, timestamp=timestamp)
+
+            with self._cond:
+                self._ring.append(frame)
+                self.captured += 1
+                self._cond.notify_all()
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+
+def capture_to_ring(source, ring, stop=None) -> None:
+    """Read source into a SharedFrameRing until it ends or stop is set.
+
+    Runs in the capture process; the reader attached to the same ring
+    sees the ring closed once the source ends.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise RuntimeError(f"Cannot open video source {source!r}")
+
+    ring.mark_closed(False)
+    try:
+        while not (stop is not None and stop.is_set()):
+            ret, img = capture.read()
+            timestamp = time.monotonic()
+
+            if not ret:
+                _LOGGER.info("Video source %r ended", source)
+                break
+
+            ring.put(img, timestamp)
+    finally:
+        ring.mark_closed()
+        capture.release()
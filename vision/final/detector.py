@@ -0,0 +1,302 @@
+"""Object detector backends for the moment sensor.
+
+Every backend returns the same post-NMS Detections struct (pixel x, y, w,
+h boxes, scores and COCO class ids), so the pipeline can pick whichever
+backend is fastest on a device at runtime.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .stats import PipelineStats, timed
+from .yolo import (
+    CONF_THRESHOLD,
+    NMS_THRESHOLD,
+    Detections,
+    decode_outputs,
+    nms
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "opencv"
+
+BACKENDS: dict[str, type[Detector]] = {}
+
+# Loaded models shared by every detector in the process
+_MODEL_CACHE: dict[tuple, object] = {}
+
+
+def register_backend(name: str):
+    """Register a Detector subclass under name."""
+    def decorator(cls: type[Detector]) -> type[Detector]:
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def create_detector(name: str = DEFAULT_BACKEND, **kwargs) -> Detector:
+    """Return a detector for the named backend."""
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown detector backend {name!r}, choose from {sorted(BACKENDS)}"
+        ) from None
+    return backend(**kwargs)
+
+
+class Detector:
+    """Object detector interface."""
+
+    name = ""
+    default_weights: str = ""
+    # The loaded model accepts any input_size, which may change between calls
+    resizable = False
+
+    def __init__(
+        self,
+        weights: str | None = None,
+        input_size: int = 416,
+        conf_threshold: float = CONF_THRESHOLD,
+        nms_threshold: float = NMS_THRESHOLD,
+        stats: PipelineStats | None = None
+    ):
+        """Initializer.
+
+        With stats, the forward pass, decoding and NMS of every call are
+        recorded as stages of the same name.
+        """
+        self.weights = weights or self.default_weights
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+        self.stats = stats
+        self._model = None
+
+    @property
+    def loaded(self) -> bool:
+        """Return True once the model is in memory."""
+        return self._model is not None
+
+    @property
+    def cache_key(self) -> tuple:
+        """Return the key identifying this model in the process cache."""
+        size = None if self.resizable else self.input_size
+        return (self.name, os.path.abspath(self.weights), size)
+
+    def load(self) -> Detector:
+        """Load the model, reusing an already loaded copy if there is one.
+
+        Nothing is loaded at construction or import time; detect() calls
+        this on first use.
+        """
+        if self._model is not None:
+            return self
+
+        key = self.cache_key
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            start = time.perf_counter()
+            model = self._load()
+            _MODEL_CACHE[key] = model
+            _LOGGER.info(
+                "Loaded %s detector from %s in %.1f s",
+                self.name, self.weights, time.perf_counter() - start
+            )
+
+        self._model = model
+        return self
+
+    def warmup(self) -> float:
+        """Run one dummy inference so the first real frame is not slowed.
+
+        Returns the warm-up time in seconds.
+        """
+        start = time.perf_counter()
+        self.detect(np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8))
+        elapsed = time.perf_counter() - start
+        _LOGGER.info("Warmed up %s detector in %.1f s", self.name, elapsed)
+        return elapsed
+
+    def detect(
+        self,
+        image: np.ndarray,
+        roi: tuple[int, int, int, int] | None = None
+    ) -> Detections:
+        """Return the detections for a BGR frame, or for its x, y, w, h roi only.
+
+        Boxes are in frame pixels either way.
+        """
+        self.load()
+        if roi is None:
+            return self._detect(image)
+
+        x, y, w, h = roi
+        return self._detect(image[y:y + h, x:x + w]).translate(x, y)
+
+    def _load(self):
+        """Load and return the backend model."""
+        raise NotImplementedError
+
+    def _detect(self, image: np.ndarray) -> Detections:
+        """Run the backend model on a BGR frame."""
+        raise NotImplementedError
+
+
+@register_backend("opencv")
+class OpenCVDetector(Detector):
+    """YOLOv3 Darknet weights through cv2.dnn."""
+
+    default_weights = "yolov3.weights"
+    resizable = True
+
+    def __init__(self, weights: str | None = None, config: str = "yolov3.cfg", **kwargs):
+        """Initializer."""
+        super().__init__(weights, **kwargs)
+        self.config = config
+
+    @property
+    def cache_key(self) -> tuple:
+        """Return the key identifying this model in the process cache."""
+        return super().cache_key + (os.path.abspath(self.config),)
+
+    def _load(self):
+        net = cv2.dnn.readNet(self.weights, self.config)
+        layer_names = net.getLayerNames()
+        output_layers = [
+            layer_names[i - 1] for i in np.asarray(net.getUnconnectedOutLayers()).reshape(-1)
+        ]
+        return net, output_layers
+
+    def _detect(self, image: np.ndarray) -> Detections:
+        net, output_layers = self._model
+        height, width = image.shape[:2]
+        size = (self.input_size, self.input_size)
+
+        with timed(self.stats, "forward"):
+            blob = cv2.dnn.blobFromImage(image, 0.00392, size, (0, 0, 0), True, crop=False)
+            net.setInput(blob)
+            outs = net.forward(output_layers)
+
+        with timed(self.stats, "decode"):
+            detections = decode_outputs(outs, width, height, self.conf_threshold)
+        with timed(self.stats, "nms"):
+            return detections.take(nms(detections, nms_threshold=self.nms_threshold))
+
+
+class _TensorFlowDetector(Detector):
+    """Shared pre/post-processing of the TensorFlow YOLOv4 exports."""
+
+    max_total_size = 50
+
+    def _input(self, image: np.ndarray) -> np.ndarray:
+        """Return the (1, size, size, 3) float32 RGB input batch."""
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        resized = cv2.resize(rgb, (self.input_size, self.input_size))
+        return (resized[np.newaxis, ...] / 255.).astype(np.float32)
+
+    @staticmethod
+    def _to_pixels(yxyx: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Convert normalized y1, x1, y2, x2 boxes to pixel x, y, w, h."""
+        scale = np.array([height, width, height, width], dtype=np.float32)
+        y1, x1, y2, x2 = (yxyx * scale).astype(np.int32).T
+        return np.stack((x1, y1, x2 - x1, y2 - y1), axis=1)
+
+
+@register_backend("saved_model")
+class SavedModelDetector(_TensorFlowDetector):
+    """YOLOv4 TensorFlow SavedModel, as exported for object_detect/detect.py."""
+
+    default_weights = "./checkpoints/yolov4-416"
+
+    def _load(self):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+        from tensorflow.python.saved_model import tag_constants  # pylint: disable=import-outside-toplevel
+
+        saved_model_loaded = tf.saved_model.load(self.weights, tags=[tag_constants.SERVING])
+        return saved_model_loaded.signatures["serving_default"]
+
+    def _detect(self, image: np.ndarray) -> Detections:
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        height, width = image.shape[:2]
+        with timed(self.stats, "forward"):
+            pred_bbox = self._model(tf.constant(self._input(image)))
+            for value in pred_bbox.values():
+                boxes = value[:, :, 0:4]
+                pred_conf = value[:, :, 4:]
+
+        with timed(self.stats, "nms"):
+            boxes, scores, classes, valid = tf.image.combined_non_max_suppression(
+                boxes=tf.reshape(boxes, (tf.shape(boxes)[0], -1, 1, 4)),
+                scores=tf.reshape(
+                    pred_conf, (tf.shape(pred_conf)[0], -1, tf.shape(pred_conf)[-1])),
+                max_output_size_per_class=self.max_total_size,
+                max_total_size=self.max_total_size,
+                iou_threshold=self.nms_threshold,
+                score_threshold=self.conf_threshold
+            )
+            count = int(valid[0])
+
+        return Detections(
+            self._to_pixels(boxes.numpy()[0, :count], width, height),
+            scores.numpy()[0, :count].astype(np.float32),
+            classes.numpy()[0, :count].astype(np.int32)
+        )
+
+
+@register_backend("tflite")
+class TFLiteDetector(_TensorFlowDetector):
+    """YOLOv4 TFLite model, through tflite_runtime when TensorFlow is absent."""
+
+    default_weights = "./checkpoints/yolov4-416.tflite"
+
+    def _load(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            import tensorflow as tf  # pylint: disable=import-outside-toplevel
+            Interpreter = tf.lite.Interpreter  # pylint: disable=invalid-name
+
+        interpreter = Interpreter(model_path=self.weights)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def _detect(self, image: np.ndarray) -> Detections:
+        height, width = image.shape[:2]
+        interpreter = self._model
+        input_details = interpreter.get_input_details()
+        output_details = interpreter.get_output_details()
+
+        with timed(self.stats, "forward"):
+            interpreter.set_tensor(input_details[0]["index"], self._input(image))
+            interpreter.invoke()
+            box_xywh, pred_conf = (
+                interpreter.get_tensor(output_details[i]["index"])[0] for i in range(2)
+            )
+
+        with timed(self.stats, "decode"):
+            # filter_boxes: keep rows whose best class clears the threshold
+            confidences = pred_conf.max(axis=1)
+            keep = np.flatnonzero(confidences >= self.conf_threshold)
+            if keep.size == 0:
+                return Detections.empty()
+
+            xy = box_xywh[keep, :2] / self.input_size
+            wh = box_xywh[keep, 2:4] / self.input_size
+            yxyx = np.hstack(((xy - wh / 2)[:, ::-1], (xy + wh / 2)[:, ::-1]))
+
+            detections = Detections(
+                self._to_pixels(yxyx, width, height),
+                confidences[keep].astype(np.float32),
+                pred_conf[keep].argmax(axis=1).astype(np.int32)
+            )
+        with timed(self.stats, "nms"):
+            return detections.take(nms(detections, nms_threshold=self.nms_threshold))
@@ -0,0 +1,90 @@
+"""Pose features for the moment sensor."""
+from __future__ import annotations
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+# x, y, z, visibility
+NUM_VALUES = 4
+VISIBILITY = 3
+# Landmarks below this visibility are guesses
+MIN_VISIBILITY = 0.5
+
+# MediaPipe Pose landmark indices
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+
+# Angle at the middle landmark, in degrees
+ANGLES = (
+    ("right_hip_angle", (RIGHT_SHOULDER, RIGHT_HIP, RIGHT_KNEE)),
+    ("left_hip_angle", (LEFT_SHOULDER, LEFT_HIP, LEFT_KNEE)),
+    ("right_knee_angle", (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE)),
+    ("left_knee_angle", (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE)),
+)
+# Vertical offset of the first landmark below the second, in image heights
+Y_DIFFS = (
+    ("right_shoulder_hip_dy", (RIGHT_SHOULDER, RIGHT_HIP)),
+    ("left_shoulder_hip_dy", (LEFT_SHOULDER, LEFT_HIP)),
+    ("right_knee_hip_dy", (RIGHT_KNEE, RIGHT_HIP)),
+    ("left_knee_hip_dy", (LEFT_KNEE, LEFT_HIP)),
+)
+
+FEATURES = tuple(name for name, _ in ANGLES + Y_DIFFS)
+(
+    RIGHT_HIP_ANGLE,
+    LEFT_HIP_ANGLE,
+    RIGHT_KNEE_ANGLE,
+    LEFT_KNEE_ANGLE,
+    RIGHT_SHOULDER_HIP_DY,
+    LEFT_SHOULDER_HIP_DY,
+    RIGHT_KNEE_HIP_DY,
+    LEFT_KNEE_HIP_DY,
+) = range(len(FEATURES))
+
+_ANGLE_INDEX = np.array([joints for _, joints in ANGLES], dtype=np.intp).T
+_Y_DIFF_INDEX = np.array([joints for _, joints in Y_DIFFS], dtype=np.intp).T
+
+
+def landmarks_to_array(landmarks, out: np.ndarray | None = None) -> np.ndarray:
+    """Return MediaPipe pose landmarks as a (33, 4) float32 array.
+
+    Columns are x, y, z and visibility. Pass out to fill an existing
+    array instead of allocating one.
+    """
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, NUM_VALUES), dtype=np.float32)
+    for row, landmark in zip(out, landmarks):
+        row[:] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+    return out
+
+
+def joint_angles(points: np.ndarray) -> np.ndarray:
+    """Return the ANGLES of (..., 33, 4) landmarks as (..., len(ANGLES))."""
+    xy = points[..., :2]
+    a, b, c = xy[..., _ANGLE_INDEX[0], :], xy[..., _ANGLE_INDEX[1], :], xy[..., _ANGLE_INDEX[2], :]
+
+    radians = (
+        np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0])
+        - np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0])
+    )
+    angle = np.abs(np.degrees(radians))
+    return np.where(angle > 180.0, 360.0 - angle, angle)
+
+
+def y_diffs(points: np.ndarray) -> np.ndarray:
+    """Return the Y_DIFFS of (..., 33, 4) landmarks as (..., len(Y_DIFFS))."""
+    y = points[..., 1]
+    return y[..., _Y_DIFF_INDEX[0]] - y[..., _Y_DIFF_INDEX[1]]
+
+
+def pose_features(points: np.ndarray) -> np.ndarray:
+    """Return the FEATURES of (..., 33, 4) landmarks as float32 (..., len(FEATURES))."""
+    return np.concatenate((joint_angles(points), y_diffs(points)), axis=-1).astype(np.float32, copy=False)
@@ -0,0 +1,101 @@
+"""In-memory frame buffer for the moment sensor."""
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+FONT = cv2.FONT_HERSHEY_PLAIN
+
+
+class FrameBuffer:
+    """One captured frame shared by the pose and object detection stages.
+
+    The captured BGR array is handed to every stage as-is. It is marked
+    read-only so that no stage can draw on the frame another stage still
+    has to analyse.
+    """
+
+    def __init__(
+        self,
+        frame: np.ndarray,
+        seq: int = 0,
+        timestamp: float | None = None
+    ):
+        """Initializer."""
+        frame.flags.writeable = False
+        self._bgr = frame
+        self._rgb: np.ndarray | None = None
+        self.seq = seq
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """Return the captured frame (BGR, read-only)."""
+        return self._bgr
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """Return the frame in RGB order, converted once on first access."""
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB)
+            self._rgb.flags.writeable = False
+        return self._rgb
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """Return the frame shape (height, width, channels)."""
+        return self._bgr.shape
+
+
+class SnapshotWriter:
+    """Opt-in debug writer for annotated frames.
+
+    Nothing touches the disk unless a directory is given, so the frame
+    path stays entirely in memory in normal operation.
+    """
+
+    def __init__(self, directory: str | None = None, every: int = 1):
+        """Initializer."""
+        self.directory = directory
+        self.every = max(1, every)
+        self._count = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if snapshots are written."""
+        return bool(self.directory)
+
+    def write(
+        self,
+        frame: FrameBuffer,
+        boxes=(),
+        labels=(),
+        colors=None
+    ) -> str | None:
+        """Write the frame with its detections drawn on a private copy."""
+        if not self.enabled:
+            return None
+
+        self._count += 1
+        if (self._count - 1) % self.every:
+            return None
+
+        img = frame.bgr.copy()
+        for i, ((x, y, w, h), label) in enumerate(zip(boxes, labels)):
+            color = colors[i % len(colors)] if colors is not None else (0, 255, 0)
+            cv2.rectangle(img, (int(x), int(y)), (int(x + w), int(y + h)), color, 2)
+            cv2.putText(img, str(label), (int(x), int(y) + 30), FONT, 2, color, 2)
+
+        path = os.path.join(self.directory, f"snapshot_{self._count:06d}.png")
+        cv2.imwrite(path, img)
+        _LOGGER.debug("Snapshot written to %s", path)
+        return path
@@ -0,0 +1,86 @@
+"""Motion gate for the moment sensor."""
+from __future__ import annotations
+
+import logging
+
+import cv2
+import numpy as np
+
+from .frame import FrameBuffer
+
+_LOGGER = logging.getLogger(__name__)
+
+GATE_SIZE = (64, 48)
+PIXEL_DELTA = 20
+CHANGE_THRESHOLD = 0.01
+HIST_BINS = 32
+HIST_THRESHOLD = 0.1
+MAX_SKIP = 30
+
+
+class MotionGate:
+    """Decide cheaply whether a frame differs enough to run inference.
+
+    Frames are compared, downscaled to grayscale, against the last frame
+    that was let through. A frame passes if enough pixels changed, if its
+    brightness histogram moved (lights switched on or off), or after
+    max_skip consecutive skips so slow drifts are eventually picked up.
+    """
+
+    def __init__(
+        self,
+        change_threshold: float = CHANGE_THRESHOLD,
+        pixel_delta: int = PIXEL_DELTA,
+        hist_threshold: float = HIST_THRESHOLD,
+        max_skip: int = MAX_SKIP,
+        size: tuple[int, int] = GATE_SIZE
+    ):
+        """Initializer."""
+        self.change_threshold = change_threshold
+        self.pixel_delta = pixel_delta
+        self.hist_threshold = hist_threshold
+        self.max_skip = max_skip
+        self.size = size
+
+        self._reference: np.ndarray | None = None
+        self._reference_hist: np.ndarray | None = None
+        self._run = 0
+
+        self.processed = 0
+        self.skipped = 0
+
+    def __repr__(self) -> str:
+        """Return the gate counters."""
+        return f"MotionGate(processed={self.processed}, skipped={self.skipped})"
+
+    def reset(self) -> None:
+        """Forget the reference frame so the next frame always passes."""
+        self._reference = None
+        self._reference_hist = None
+        self._run = 0
+
+    def check(self, frame: FrameBuffer) -> bool:
+        """Return True if the frame should be analysed, False to skip it."""
+        small = cv2.resize(
+            cv2.cvtColor(frame.bgr, cv2.COLOR_BGR2GRAY),
+            self.size,
+            interpolation=cv2.INTER_AREA
+        )
+        hist = cv2.calcHist([small], [0], None, [HIST_BINS], [0, 256])
+        cv2.normalize(hist, hist)
+
+        if self._reference is not None and self._run < self.max_skip:
+            diff = cv2.absdiff(small, self._reference)
+            changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+            shift = cv2.compareHist(hist, self._reference_hist, cv2.HISTCMP_BHATTACHARYYA)
+
+            if changed < self.change_threshold and shift < self.hist_threshold:
+                self._run += 1
+                self.skipped += 1
+                return False
+
+        self._reference = small
+        self._reference_hist = hist
+        self._run = 0
+        self.processed += 1
+        return True
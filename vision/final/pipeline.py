@@ -0,0 +1,361 @@
+"""Moment pipeline for one camera."""
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import numpy as np
+
+from .capture import CaptureStage
+from .detector import DEFAULT_BACKEND, create_detector
+from .features import landmarks_to_array, pose_features
+from .frame import FrameBuffer, SnapshotWriter
+from .motion import MotionGate
+from .pose import PoseEstimator
+from .posture import classify_posture
+from .recorder import Recorder, Sample
+from .roi import ROI_MARGIN, person_roi
+from .scheduler import INPUT_SIZES, AdaptiveScheduler
+from .stats import STATS_INTERVAL, PipelineStats
+from .ring import FRAME_SHAPE, SharedFrameRing
+from .scene import CONTEXTS_FILE, COUNT, SCORING, WEIGHTED, SceneScorer, detection_weights
+from .vote import VOTE_SIZE, MajorityVote
+from .yolo import Detections
+
+_LOGGER = logging.getLogger(__name__)
+
+# Objects are only looked at while the person is in this posture
+DETECT_MOTION = "stand"
+# Checked in this order when several moments win at once
+MOMENTS = ("work", "media", "meal", "sleep")
+STABLE_TURNS = 3
+FRAME_INTERVAL = 0.2
+INITIAL_MOMENT = "Initial"
+
+
+class MomentPipeline:
+    """Turn the frames of one camera into moments.
+
+    All state lives on the instance, so several pipelines can run side by
+    side, one per camera. Frames go through the motion gate, pose
+    estimation and, while the person stands, object detection; a moment
+    is reported once vote_threshold of the last vote_window votes agree.
+    Which objects point to which moment is read from the contexts file;
+    with scoring="weighted" each object counts by its confidence, size and
+    distance to the person's hands and hips instead of once.
+
+    The detector backend loads weights, or its own default file when
+    None; the TensorFlow backends default to a path relative to the
+    working directory, so they usually need it.
+
+    With roi_size set, the detector runs at that smaller input size on a
+    crop around the person's landmarks, grown by roi_margin, and only
+    falls back to the full frame when there is no usable crop. Backends
+    that are not resizable only accept their own input size.
+
+    With target_latency set, run() no longer sleeps a fixed interval: an
+    AdaptiveScheduler picks the interval and, for backends that allow it,
+    the full-frame detector input size from the measured latency.
+
+    With record_dir set, the landmarks, detections and moments of every
+    frame are written there by a Recorder, and replay() can later feed
+    them back through the same decision logic without camera or models.
+
+    The latency of every stage is recorded in stats and written to the log
+    every stats_interval seconds while running.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        detector: str = DEFAULT_BACKEND,
+        weights: str | None = None,
+        snapshot_dir: str | None = None,
+        warmup: bool = False,
+        record_dir: str | None = None,
+        vote_window: int = VOTE_SIZE,
+        vote_threshold: int | None = None,
+        contexts: str = CONTEXTS_FILE,
+        classes: str | None = None,
+        scoring: str = COUNT,
+        roi_size: int | None = None,
+        roi_margin: float = ROI_MARGIN,
+        target_latency: float | None = None,
+        stats_interval: float = STATS_INTERVAL
+    ):
+        """Initializer."""
+        if scoring not in SCORING:
+            raise ValueError(f"Unknown scoring {scoring!r}, expected one of {SCORING}")
+        self.camera_id = camera_id
+        self.stats = PipelineStats()
+        self.stats_interval = stats_interval
+        self.detector = create_detector(detector, weights=weights, stats=self.stats)
+        self.roi_detector = None
+        if roi_size:
+            if not self.detector.resizable and roi_size != self.detector.input_size:
+                raise ValueError(
+                    f"The {detector} detector only runs at input size "
+                    f"{self.detector.input_size}, got roi_size {roi_size}"
+                )
+            self.roi_detector = create_detector(
+                detector, weights=weights, input_size=roi_size, stats=self.stats
+            )
+        self.roi_margin = roi_margin
+        self.scheduler = None
+        if target_latency:
+            sizes = INPUT_SIZES if self.detector.resizable else (self.detector.input_size,)
+            self.scheduler = AdaptiveScheduler(
+                target_latency, vote_window, sizes, size=self.detector.input_size
+            )
+        self.snapshot = SnapshotWriter(snapshot_dir)
+        self.gate = MotionGate()
+        self.pose = PoseEstimator(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        self.scene = SceneScorer.from_files(contexts, classes)
+        self.scoring = scoring
+        self.frame_shape = FRAME_SHAPE
+        self.colors = np.random.uniform(0, 255, size=(len(self.scene.classes), 3))
+        self._warmup = warmup
+        self.recorder = Recorder(record_dir) if record_dir else None
+
+        self.stage = {"CurrentMoment": INITIAL_MOMENT, "PreviousMoment": "test upcoming"}
+        self.motion = "-"
+        self.votes = MajorityVote(vote_window, vote_threshold, priority=MOMENTS)
+        # Class ids of the objects seen now, at the last moment and new since
+        self.present = self.past = self.result = np.empty(0, dtype=np.int32)
+        self.weights: np.ndarray | None = None
+        self.state_cnt = 0
+
+        self._results = None
+        self._points: np.ndarray | None = None
+        self._detections = None
+        self._detect_time: float | None = None
+
+    def __enter__(self) -> MomentPipeline:
+        """Open the models."""
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        """Close the models."""
+        self.close()
+
+    def open(self) -> MomentPipeline:
+        """Build the pose graph and, if asked, load the detector."""
+        self.pose.open()
+        self.pose.warmup()
+        if self._warmup:
+            self.detector.warmup()
+            if self.roi_detector is not None:
+                self.roi_detector.warmup()
+        return self
+
+    def close(self) -> None:
+        """Release the pose graph and write out the recording."""
+        self.pose.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def process(self, frame: FrameBuffer) -> dict[str, Any] | None:
+        """Analyse one frame; return the moment once enough votes agree."""
+        with self.stats.time("gate"):
+            changed = self.gate.check(frame)
+        self.frame_shape = frame.shape
+
+        if changed or self._results is None:
+            with self.stats.time("pose"):
+                self._results = self.pose.process(frame.rgb)
+
+        points = None
+        if self._results.pose_landmarks is not None:
+            points = self._points = landmarks_to_array(
+                self._results.pose_landmarks.landmark, self._points
+            )
+
+        def detect() -> Detections:
+            if changed or self._detections is None:
+                roi = None
+                if self.roi_detector is not None and points is not None:
+                    roi = person_roi(points, frame.shape, self.roi_margin)
+                start = time.perf_counter()
+                if roi is None:
+                    self._detections = self.detector.detect(frame.bgr)
+                    self._detect_time = time.perf_counter() - start
+                else:
+                    self._detections = self.roi_detector.detect(frame.bgr, roi)
+                self.stats.record("detect", time.perf_counter() - start)
+            labels = [self.scene.classes[class_id] for class_id in self._detections.class_ids]
+            self.snapshot.write(frame, self._detections.boxes, labels, self.colors)
+            return self._detections
+
+        return self.step(frame.timestamp, points, detect)
+
+    def step(
+        self,
+        timestamp: float,
+        points: np.ndarray | None,
+        detect: Callable[[], Detections]
+    ) -> dict[str, Any] | None:
+        """Update the votes from one frame's landmarks and, if needed, objects.
+
+        detect is only called while the person is in DETECT_MOTION.
+        """
+        detections = None
+        state = self._decide(points, detect)
+        if self.motion == DETECT_MOTION:
+            detections = self._detections
+        if self.recorder is not None:
+            self.recorder.record(
+                timestamp, points, detections, state["CurrentMoment"] if state else ""
+            )
+        return state
+
+    def _decide(
+        self,
+        points: np.ndarray | None,
+        detect: Callable[[], Detections]
+    ) -> dict[str, Any] | None:
+        """Return the moment once enough votes agree."""
+        if points is not None:
+            self.motion = classify_posture(pose_features(points), self.motion)
+
+        if self.motion == DETECT_MOTION:
+            detections = self._detections = detect()
+            self.present = detections.class_ids
+
+            start = time.perf_counter()
+            if np.array_equal(self.present, self.past):
+                # Nothing new for STABLE_TURNS frames: keep the current moment
+                if self.state_cnt >= STABLE_TURNS:
+                    return None
+                self.state_cnt += 1
+            else:
+                self.state_cnt = 0
+                weights = None
+                if self.scoring == WEIGHTED:
+                    weights = detection_weights(detections, self.frame_shape, points)
+
+                if len(self.past) > len(self.present):
+                    self.result, self.weights = self.present, weights
+                elif weights is None:
+                    self.result = np.setdiff1d(self.present, self.past)
+                else:
+                    # Every detection of a new class counts, by its own weight
+                    new = ~np.isin(self.present, self.past)
+                    self.result, self.weights = self.present[new], weights[new]
+
+            scene = self.scene.classify(self.result, self.weights)
+            self.stats.record("scoring", time.perf_counter() - start)
+            if scene is not None:
+                self.votes.push(scene)
+
+        elif self.motion == "lie":
+            self.votes.push("sleep")
+
+        moment = self.votes.winner
+        if moment is None:
+            return None
+
+        self.stage["CurrentMoment"] = moment
+        state = dict(self.stage, Confidence=self.votes.confidence())
+        self.stage["CurrentMoment"] = "initial"
+        self.past = self.present
+
+        _LOGGER.info(
+            "%s: %s (motion %s, confidence %.2f)",
+            self.camera_id, moment, self.motion, state["Confidence"]
+        )
+        return state
+
+    def replay(
+        self,
+        samples: Iterable[Sample],
+        publish: Callable[[dict[str, Any]], None] | None = None,
+        frame_shape: tuple[int, ...] = FRAME_SHAPE
+    ) -> int:
+        """Feed recorded samples through the decision logic at full speed.
+
+        frame_shape is the size of the recorded frames, for weighted
+        scoring. Returns the number of frames whose decided moment differs
+        from the recorded one.
+        """
+        self.frame_shape = frame_shape
+        mismatches = 0
+        for sample in samples:
+            detections = sample.detections
+            state = self.step(
+                sample.timestamp,
+                sample.landmarks,
+                lambda: Detections.empty() if detections is None else detections
+            )
+            moment = state["CurrentMoment"] if state else ""
+            mismatches += moment != sample.moment
+            if state is not None and publish is not None:
+                publish(state)
+        return mismatches
+
+    def run(
+        self,
+        source,
+        publish: Callable[[dict[str, Any]], None],
+        stop: threading.Event | None = None,
+        interval: float = FRAME_INTERVAL,
+        report: Callable[[PipelineStats], None] | None = None
+    ) -> None:
+        """Analyse source and publish every moment until it ends.
+
+        source is a SharedFrameRing filled by a capture process, or a
+        camera index, file or URL captured on a thread of this process.
+        The initial stage is published first, so clients get a state
+        before the first moment. Every stats_interval seconds the stage
+        latencies are logged and passed to report.
+        """
+        publish(dict(self.stage))
+        next_report = time.monotonic() + self.stats_interval
+        if isinstance(source, SharedFrameRing):
+            stage = contextlib.nullcontext(source)
+        else:
+            stage = CaptureStage(source)
+
+        with stage as capture:
+            while capture.running and not (stop is not None and stop.is_set()):
+                frame = capture.latest(timeout=1.0)
+                if frame is None:
+                    continue
+
+                # Time from capture until the frame is picked up
+                self.stats.record("capture", time.monotonic() - frame.timestamp)
+                start = time.perf_counter()
+                self._detect_time = None
+                state = self.process(frame)
+                self.stats.record("frame", time.perf_counter() - start)
+                if state is not None:
+                    with self.stats.time("publish"):
+                        publish(state)
+
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + self.stats_interval
+                    self._report(report)
+
+                if self.scheduler is not None:
+                    self.detector.input_size = self.scheduler.observe(
+                        time.perf_counter() - start, self._detect_time
+                    )
+                    interval = self.scheduler.interval
+                time.sleep(interval)
+
+            _LOGGER.info(
+                "%s: %d frames captured, %d dropped, %r",
+                self.camera_id, capture.captured, capture.dropped, self.gate
+            )
+            if self.scheduler is not None:
+                _LOGGER.info("%s: %r", self.camera_id, self.scheduler)
+            self._report(report)
+
+    def _report(self, report: Callable[[PipelineStats], None] | None) -> None:
+        """Log the stage latencies and hand them to report."""
+        _LOGGER.info("%s latency:\n%s", self.camera_id, self.stats.format())
+        if report is not None:
+            report(self.stats)
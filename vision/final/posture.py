@@ -0,0 +1,83 @@
+"""Posture classification for the moment sensor."""
+from __future__ import annotations
+
+import numpy as np
+
+from .features import (
+    LEFT_HIP_ANGLE,
+    LEFT_KNEE_HIP_DY,
+    LEFT_SHOULDER_HIP_DY,
+    RIGHT_HIP_ANGLE,
+    RIGHT_KNEE_HIP_DY,
+    RIGHT_SHOULDER_HIP_DY,
+    pose_features
+)
+
+# Index 0 means no rule matched
+POSTURES = ("-", "lie", "sit", "stand")
+UNKNOWN, LIE, SIT, STAND = range(len(POSTURES))
+_NAMES = np.array(POSTURES)
+
+LIE_Y_DIFF = 0.05
+KNEE_Y_DIFF = 0.1
+BENT = 70
+FOLDED = 75
+CROUCHED = 100
+STRAIGHT = 140
+
+
+def posture_codes(features: np.ndarray) -> np.ndarray:
+    """Return the posture code of each row of (N, len(FEATURES)) features.
+
+    The sit/stand/lie rules are evaluated as boolean masks over all rows;
+    np.select keeps the first matching rule, as the original if-cascade
+    did. Rows matching no rule get UNKNOWN.
+    """
+    right = features[..., RIGHT_HIP_ANGLE]
+    left = features[..., LEFT_HIP_ANGLE]
+    right_knee_low = features[..., RIGHT_KNEE_HIP_DY] <= KNEE_Y_DIFF
+    left_knee_low = features[..., LEFT_KNEE_HIP_DY] <= KNEE_Y_DIFF
+
+    right_straight = right > STRAIGHT
+    left_straight = left > STRAIGHT
+    right_bent = (right > BENT) & (right <= STRAIGHT)
+    left_bent = (left > BENT) & (left <= STRAIGHT)
+
+    lie = (
+        (np.abs(features[..., RIGHT_SHOULDER_HIP_DY]) < LIE_Y_DIFF)
+        | (np.abs(features[..., LEFT_SHOULDER_HIP_DY]) < LIE_Y_DIFF)
+    )
+    sit = (
+        (right_straight & left_bent) | (left_straight & right_bent)
+        | (right_straight & (left < FOLDED)) | (left_straight & (right < FOLDED))
+        | (right_bent & (left <= FOLDED)) | (left_bent & (right <= FOLDED))
+    )
+    both_bent = right_bent & left_bent
+    crouched = (right <= CROUCHED) & (left <= CROUCHED) & (right_knee_low | left_knee_low)
+
+    return np.select(
+        [lie, sit, both_bent & right_knee_low, both_bent, right_straight & left_straight, crouched],
+        [LIE, SIT, SIT, STAND, STAND, SIT],
+        default=UNKNOWN
+    ).astype(np.int8)
+
+
+def classify_postures(landmarks: np.ndarray, initial: str = POSTURES[UNKNOWN]) -> np.ndarray:
+    """Return the posture name of each frame of (N, 33, 4) landmarks.
+
+    As in the live loop, a frame matching no rule keeps the posture of the
+    frame before it; frames before the first match get initial.
+    """
+    codes = posture_codes(pose_features(landmarks))
+    codes = np.concatenate(([POSTURES.index(initial)], codes))
+
+    # Forward-fill UNKNOWN with the last known code
+    known = np.where(codes != UNKNOWN, np.arange(len(codes)), 0)
+    np.maximum.accumulate(known, out=known)
+    return _NAMES[codes[known]][1:]
+
+
+def classify_posture(features: np.ndarray, motion: str) -> str:
+    """Return the posture of one feature vector, or motion if no rule matches."""
+    code = int(posture_codes(features))
+    return motion if code == UNKNOWN else POSTURES[code]
@@ -0,0 +1,213 @@
+"""Recording and replay of pipeline observations."""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import numpy as np
+
+from .features import NUM_LANDMARKS, NUM_VALUES
+from .yolo import Detections
+
+_LOGGER = logging.getLogger(__name__)
+
+SEGMENT_FRAMES = 1000
+MOMENT_DTYPE = "<U16"
+
+
+@dataclass(frozen=True)
+class Sample:
+    """What the pipeline saw and decided for one frame.
+
+    landmarks is None when no pose was found and detections is None when
+    the detector did not run; moment is "" unless one was decided.
+    """
+
+    timestamp: float
+    landmarks: np.ndarray | None
+    detections: Detections | None
+    moment: str
+
+
+class Recorder:
+    """Append pipeline samples to a recording directory.
+
+    Samples are buffered and written every SEGMENT_FRAMES frames as a
+    segment directory of plain .npy columns, so a recording can be read
+    back memory-mapped:
+
+        timestamps   (N,) float64, monotonic seconds
+        pose         (N,) bool, a pose was found
+        landmarks    (N, 33, 4) float32, NaN without pose
+        detected     (N,) bool, the detector ran
+        offsets      (N + 1,) int64, detections of frame i are rows
+                     offsets[i]:offsets[i + 1] of the three columns below
+        boxes        (M, 4) int32
+        scores       (M,) float32
+        class_ids    (M,) int32
+        moments      (N,) unicode, "" unless a moment was decided
+    """
+
+    def __init__(self, directory: str, segment_frames: int = SEGMENT_FRAMES):
+        """Initializer."""
+        self.directory = directory
+        self.segment_frames = max(1, segment_frames)
+        os.makedirs(directory, exist_ok=True)
+
+        self._segment = len(_segment_dirs(directory))
+        self._empty = np.full((NUM_LANDMARKS, NUM_VALUES), np.nan, dtype=np.float32)
+        self._reset()
+
+        self.frames = 0
+
+    def __enter__(self) -> Recorder:
+        """Start recording."""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Write what is buffered."""
+        self.close()
+
+    def _reset(self) -> None:
+        """Start a new segment buffer."""
+        self._timestamps: list[float] = []
+        self._landmarks: list[np.ndarray] = []
+        self._pose: list[bool] = []
+        self._detected: list[bool] = []
+        self._detections: list[Detections] = []
+        self._counts: list[int] = []
+        self._moments: list[str] = []
+
+    def record(
+        self,
+        timestamp: float,
+        landmarks: np.ndarray | None,
+        detections: Detections | None,
+        moment: str = ""
+    ) -> None:
+        """Buffer one sample, writing a segment once it is full."""
+        self._timestamps.append(timestamp)
+        self._pose.append(landmarks is not None)
+        self._landmarks.append(self._empty if landmarks is None else landmarks.copy())
+        self._detected.append(detections is not None)
+        self._counts.append(0 if detections is None else len(detections))
+        if detections is not None and len(detections):
+            self._detections.append(detections)
+        self._moments.append(moment)
+        self.frames += 1
+
+        if len(self._timestamps) >= self.segment_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered samples as a new segment."""
+        if not self._timestamps:
+            return
+
+        path = os.path.join(self.directory, f"segment_{self._segment:06d}")
+        partial = path + ".partial"
+        os.makedirs(partial, exist_ok=True)
+
+        if self._detections:
+            boxes = np.concatenate([d.boxes for d in self._detections])
+            scores = np.concatenate([d.scores for d in self._detections])
+            class_ids = np.concatenate([d.class_ids for d in self._detections])
+        else:
+            empty = Detections.empty()
+            boxes, scores, class_ids = empty.boxes, empty.scores, empty.class_ids
+
+        columns = {
+            "timestamps": np.asarray(self._timestamps, dtype=np.float64),
+            "pose": np.asarray(self._pose, dtype=bool),
+            "landmarks": np.stack(self._landmarks).astype(np.float32, copy=False),
+            "detected": np.asarray(self._detected, dtype=bool),
+            "offsets": np.concatenate(([0], np.cumsum(self._counts))).astype(np.int64),
+            "boxes": boxes.astype(np.int32, copy=False),
+            "scores": scores.astype(np.float32, copy=False),
+            "class_ids": class_ids.astype(np.int32, copy=False),
+            "moments": np.asarray(self._moments, dtype=MOMENT_DTYPE)
+        }
+        for name, column in columns.items():
+            np.save(os.path.join(partial, name + ".npy"), column)
+
+        # A segment only appears under its final name once it is complete
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(partial, path)
+        _LOGGER.debug("Wrote %d samples to %s", len(self._timestamps), path)
+
+        self._segment += 1
+        self._reset()
+
+    def close(self) -> None:
+        """Write what is buffered."""
+        self.flush()
+
+
+def _segment_dirs(directory: str) -> list[str]:
+    """Return the complete segments of a recording in order."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith("segment_") and not name.endswith(".partial")
+    )
+
+
+class Recording:
+    """Read a directory written by Recorder, memory-mapped."""
+
+    def __init__(self, directory: str):
+        """Initializer."""
+        self.directory = directory
+        self.segments = [
+            {
+                name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+                for name in os.listdir(path)
+                if name.endswith(".npy")
+            }
+            for path in _segment_dirs(directory)
+        ]
+
+    def __len__(self) -> int:
+        """Return the number of recorded frames."""
+        return sum(len(segment["timestamps"]) for segment in self.segments)
+
+    def column(self, name: str) -> np.ndarray:
+        """Return one per-frame column over all segments.
+
+        A single-segment recording is returned memory-mapped; several
+        segments are concatenated.
+        """
+        columns = [segment[name] for segment in self.segments]
+        if len(columns) == 1:
+            return columns[0]
+        return np.concatenate(columns)
+
+    @property
+    def landmarks(self) -> np.ndarray:
+        """Return the (N, 33, 4) landmarks, for classify_postures()."""
+        return self.column("landmarks")
+
+    def __iter__(self) -> Iterator[Sample]:
+        """Yield the recorded samples in order."""
+        for segment in self.segments:
+            offsets = segment["offsets"]
+            for i, timestamp in enumerate(segment["timestamps"]):
+                detections = None
+                if segment["detected"][i]:
+                    rows = slice(offsets[i], offsets[i + 1])
+                    detections = Detections(
+                        segment["boxes"][rows],
+                        segment["scores"][rows],
+                        segment["class_ids"][rows]
+                    )
+
+                yield Sample(
+                    float(timestamp),
+                    segment["landmarks"][i] if segment["pose"][i] else None,
+                    detections,
+                    str(segment["moments"][i])
+                )
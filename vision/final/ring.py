@@ -0,0 +1,205 @@
+"""Shared-memory frame ring for the moment sensor."""
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .frame import FrameBuffer
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_SHAPE = (480, 640, 3)
+RING_SLOTS = 4
+POLL_INTERVAL = 0.002
+
+# Header fields, followed by one sequence number per slot
+HEAD, HELD, CLOSED = range(3)
+HEADER_FIELDS = 3
+WRITING = -1
+
+
+class SharedFrameRing:
+    """Fixed-size ring of frames in shared memory, one writer and one reader.
+
+    The capture process writes each frame once into the next free slot and
+    stamps it with a sequence number; the inference process gets the newest
+    frame as a read-only view of that slot, so no frame is pickled or copied
+    between processes. The slot the reader holds is never chosen for
+    writing, so a frame stays intact until the reader asks for the next one.
+    Frames that arrive while the reader is busy are overwritten and counted
+    as dropped (latest-frame-wins).
+
+    The writer choosing a slot and the reader taking one are serialized by
+    lock, a multiprocessing lock every process of the ring shares: plain
+    shared-memory writes give no ordering between processes, so without it
+    the writer could pick the slot the reader is taking at the same time.
+    The frame itself is copied outside the lock.
+    """
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        shape: tuple[int, int, int],
+        slots: int,
+        owner: bool,
+        lock: mp.Lock
+    ):
+        """Initializer, use create() or attach()."""
+        self._shm = shm
+        self.lock = lock
+        self.shape = tuple(shape)
+        self.slots = slots
+        self._owner = owner
+
+        offset = 0
+        self._meta = np.ndarray((HEADER_FIELDS + slots,), np.int64, shm.buf, offset)
+        offset += self._meta.nbytes
+        self._timestamps = np.ndarray((slots,), np.float64, shm.buf, offset)
+        offset += self._timestamps.nbytes
+        self._frames = np.ndarray((slots, *self.shape), np.uint8, shm.buf, offset)
+
+        self._slot = -1
+        self._last_seq = 0
+
+        self.dropped = 0
+
+    @staticmethod
+    def _size(shape: tuple[int, int, int], slots: int) -> int:
+        """Return the bytes needed for a ring."""
+        return 8 * (HEADER_FIELDS + slots) + 8 * slots + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(
+        cls,
+        shape: tuple[int, int, int] = FRAME_SHAPE,
+        slots: int = RING_SLOTS,
+        name: str | None = None
+    ) -> SharedFrameRing:
+        """Allocate a new ring; the creator unlinks it on close().
+
+        Processes attaching to it need its name and lock.
+        """
+        if slots < 3:
+            raise ValueError("A frame ring needs at least 3 slots")
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(shape, slots))
+        # A spawn context lock can be handed to processes of any start method
+        ring = cls(shm, shape, slots, owner=True, lock=mp.get_context("spawn").Lock())
+        ring._meta[:] = 0
+        ring._meta[HELD] = -1
+        return ring
+
+    @classmethod
+    def attach(
+        cls,
+        name: str,
+        lock: mp.Lock,
+        shape: tuple[int, int, int] = FRAME_SHAPE,
+        slots: int = RING_SLOTS
+    ) -> SharedFrameRing:
+        """Open a ring created by another process, given its name and lock."""
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, owner=False, lock=lock)
+
+    def __enter__(self) -> SharedFrameRing:
+        """Use the ring."""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Release the ring."""
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """Return the shared memory name other processes attach to."""
+        return self._shm.name
+
+    @property
+    def seq(self) -> int:
+        """Return the sequence number of the newest frame."""
+        return int(self._meta[HEAD])
+
+    @property
+    def captured(self) -> int:
+        """Return the number of frames written so far."""
+        return self.seq
+
+    @property
+    def running(self) -> bool:
+        """Return True until the writer marks the ring closed."""
+        return not self._meta[CLOSED]
+
+    def mark_closed(self, closed: bool = True) -> None:
+        """Tell the reader that no more frames will come."""
+        self._meta[CLOSED] = int(closed)
+
+    def put(self, img: np.ndarray, timestamp: float | None = None) -> int:
+        """Copy a frame into the next free slot and return its sequence number.
+
+        Frames of another size are resized to the ring shape.
+        """
+        if img.shape != self.shape:
+            img = cv2.resize(img, (self.shape[1], self.shape[0]))
+
+        slots = self._meta[HEADER_FIELDS:]
+        with self.lock:
+            slot = (self._slot + 1) % self.slots
+            if slot == self._meta[HELD]:
+                slot = (slot + 1) % self.slots
+            slots[slot] = WRITING
+
+        self._frames[slot] = img
+        self._timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+        with self.lock:
+            seq = int(self._meta[HEAD]) + 1
+            slots[slot] = seq
+            self._meta[HEAD] = seq
+
+        self._slot = slot
+        return seq
+
+    def latest(self, timeout: float | None = None) -> FrameBuffer | None:
+        """Return the newest frame not yet handed out, as a view of its slot.
+
+        Blocks until a new frame arrives, the timeout expires or the ring
+        is closed; returns None in the latter two cases.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        slots = self._meta[HEADER_FIELDS:]
+
+        while True:
+            # Read before the head, so frames put before closing are not missed
+            running = self.running
+            with self.lock:
+                head = int(self._meta[HEAD])
+                if head > self._last_seq:
+                    # The writer publishes the head and its slot under the lock
+                    slot = int(np.flatnonzero(slots == head)[0])
+                    self._meta[HELD] = slot
+                    self.dropped += head - self._last_seq - 1
+                    self._last_seq = head
+                    frame = self._frames[slot]
+                    return FrameBuffer(frame, seq=head, timestamp=float(self._timestamps[slot]))
+
+            if not running or (deadline is not None and time.monotonic() >= deadline):
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def valid(self, frame: FrameBuffer) -> bool:
+        """Return True if the slot of frame has not been rewritten since."""
+        return bool(np.any(self._meta[HEADER_FIELDS:] == frame.seq))
+
+    def close(self) -> None:
+        """Detach from the ring, and free it if this process created it."""
+        if self._shm is None:
+            return
+
+        self._meta = self._timestamps = self._frames = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
@@ -0,0 +1,43 @@
+"""Person region of interest for the object detector."""
+from __future__ import annotations
+
+import numpy as np
+
+from .features import MIN_VISIBILITY, VISIBILITY
+
+# Margin added on every side, as a share of the person's larger side
+ROI_MARGIN = 0.5
+# Input size the detector runs at on the crop
+ROI_SIZE = 320
+# A crop covering more of the frame than this saves nothing
+MAX_ROI_SHARE = 0.8
+
+
+def person_roi(
+    points: np.ndarray,
+    shape: tuple[int, ...],
+    margin: float = ROI_MARGIN
+) -> tuple[int, int, int, int] | None:
+    """Return the x, y, w, h pixel box around the person and what they can reach.
+
+    The box bounds the visible (33, 4) landmarks, grows by margin times its
+    larger side on every side so objects in hand or on the lap stay inside,
+    and is clipped to the frame. Returns None when too few landmarks are
+    visible or the box would cover most of the frame anyway.
+    """
+    height, width = shape[:2]
+    visible = points[points[:, VISIBILITY] >= MIN_VISIBILITY]
+    if len(visible) < 2:
+        return None
+
+    x0, y0 = visible[:, :2].min(axis=0) * (width, height)
+    x1, y1 = visible[:, :2].max(axis=0) * (width, height)
+    pad = margin * max(x1 - x0, y1 - y0)
+
+    left, top = max(0, int(x0 - pad)), max(0, int(y0 - pad))
+    right, bottom = min(width, int(np.ceil(x1 + pad))), min(height, int(np.ceil(y1 + pad)))
+    if right <= left or bottom <= top:
+        return None
+    if (right - left) * (bottom - top) > MAX_ROI_SHARE * width * height:
+        return None
+    return left, top, right - left, bottom - top
@@ -0,0 +1,161 @@
+"""Scene scoring for the moment sensor."""
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from .features import LEFT_HIP, LEFT_WRIST, MIN_VISIBILITY, RIGHT_HIP, RIGHT_WRIST, VISIBILITY
+from .yolo import Detections
+
+# COCO class names, indexed by the class ids YOLO reports
+CLASSES = (
+    "person", "bicycle", "car", "motorcycle",
+    "airplane", "bus", "train", "truck", "boat", "traffic light", "fire hydrant",
+    "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse",
+    "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack",
+    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis",
+    "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard",
+    "surfboard", "tennis racket", "bottle", "wine glass", "cup", "fork", "knife",
+    "spoon", "bowl", "banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog",
+    "pizza", "donut", "cake", "chair", "couch", "potted plant", "bed", "dining table",
+    "toilet", "tv", "laptop", "mouse", "remote", "keyboard",
+    "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator",
+    "book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"
+)
+
+CONTEXTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "contexts.json")
+# Class ids that belong to no context
+NO_CONTEXT = -1
+
+# Each detection counts once, or by detection_weights()
+COUNT = "count"
+WEIGHTED = "weighted"
+SCORING = (COUNT, WEIGHTED)
+
+# Objects in use are near the hands or the lap
+ANCHORS = (LEFT_WRIST, RIGHT_WRIST, LEFT_HIP, RIGHT_HIP)
+# Distance from the nearest anchor, in frame heights, that halves a weight
+REACH = 0.25
+
+
+def load_class_names(path: str) -> tuple[str, ...]:
+    """Return the class names of a .names file, one per line."""
+    with open(path, encoding="utf-8") as file:
+        return tuple(line.strip() for line in file if line.strip())
+
+
+def load_contexts(path: str = CONTEXTS_FILE) -> dict[str, list[str]]:
+    """Return the context definitions of a JSON file.
+
+    The file maps each context to the class names that point to it, e.g.
+    {"meal": ["cup", "fork"], "work": ["laptop"]}.
+    """
+    with open(path, encoding="utf-8") as file:
+        contexts = json.load(file)
+    if not isinstance(contexts, dict) or not all(
+        isinstance(labels, list) for labels in contexts.values()
+    ):
+        raise ValueError(f"{path}: expected an object of context -> class name list")
+    return contexts
+
+
+def detection_weights(
+    detections: Detections,
+    shape: tuple[int, ...],
+    points: np.ndarray | None = None,
+    reach: float = REACH
+) -> np.ndarray:
+    """Return a float32 weight per detection for weighted scoring.
+
+    A detection weighs its confidence times the square root of the share
+    of the frame its box covers. With (33, 4) pose landmarks, it is also
+    divided by 1 + d / reach, d being the distance in frame heights from
+    the box to the nearest visible hand or hip.
+    """
+    height, width = shape[:2]
+    boxes = detections.boxes.astype(np.float32)
+    area = boxes[:, 2] * boxes[:, 3] / float(width * height)
+    weights = detections.scores * np.sqrt(np.clip(area, 0.0, 1.0))
+
+    if points is not None and len(boxes):
+        anchors = points[list(ANCHORS)]
+        anchors = anchors[anchors[:, VISIBILITY] >= MIN_VISIBILITY]
+        if len(anchors):
+            # (N, 1) box edges against (K,) anchors, 0 when inside the box
+            x, y = anchors[:, 0] * width, anchors[:, 1] * height
+            left, top = boxes[:, :1], boxes[:, 1:2]
+            right, bottom = left + boxes[:, 2:3], top + boxes[:, 3:4]
+            dx = np.maximum(np.maximum(left - x, x - right), 0.0)
+            dy = np.maximum(np.maximum(top - y, y - bottom), 0.0)
+            distance = np.hypot(dx, dy).min(axis=1) / height
+            weights = weights / (1.0 + distance / reach)
+
+    return weights.astype(np.float32, copy=False)
+
+
+class SceneScorer:
+    """Score detections against contexts through a class id lookup table.
+
+    The table maps every class id to the index of its context, so scoring
+    a frame is one lookup and one np.bincount over its class ids instead
+    of a membership test per label and context.
+    """
+
+    def __init__(
+        self,
+        contexts: dict[str, list[str]] | None = None,
+        classes: tuple[str, ...] = CLASSES
+    ):
+        """Initializer."""
+        if contexts is None:
+            contexts = load_contexts()
+        self.contexts = tuple(contexts)
+        self.classes = classes
+
+        index = {name: class_id for class_id, name in enumerate(classes)}
+        self.lookup = np.full(len(classes), NO_CONTEXT, dtype=np.intp)
+        for context_id, (context, labels) in enumerate(contexts.items()):
+            unknown = [label for label in labels if label not in index]
+            if unknown:
+                raise ValueError(f"context {context!r}: unknown classes {unknown}")
+
+            for label in labels:
+                class_id = index[label]
+                if self.lookup[class_id] != NO_CONTEXT:
+                    raise ValueError(
+                        f"class {label!r} is in both {self.contexts[self.lookup[class_id]]!r} "
+                        f"and {context!r}"
+                    )
+                self.lookup[class_id] = context_id
+
+    @classmethod
+    def from_files(cls, contexts: str = CONTEXTS_FILE, classes: str | None = None) -> SceneScorer:
+        """Build a scorer from a contexts file and, optionally, a .names file."""
+        names = CLASSES if classes is None else load_class_names(classes)
+        return cls(load_contexts(contexts), names)
+
+    def __repr__(self) -> str:
+        """Return the contexts."""
+        return f"SceneScorer(contexts={self.contexts}, classes={len(self.classes)})"
+
+    def score(self, class_ids: np.ndarray, weights: np.ndarray | None = None) -> np.ndarray:
+        """Return the number, or total weight, of class_ids pointing to each context."""
+        context_ids = self.lookup[np.asarray(class_ids, dtype=np.intp)]
+        known = context_ids != NO_CONTEXT
+        return np.bincount(
+            context_ids[known],
+            weights=None if weights is None else weights[known],
+            minlength=len(self.contexts)
+        )
+
+    def classify(self, class_ids: np.ndarray, weights: np.ndarray | None = None) -> str | None:
+        """Return the context scoring highest, or None on a tie or no match."""
+        scores = self.score(class_ids, weights)
+        if not len(scores):
+            return None
+        best = int(np.argmax(scores))
+        if scores[best] == 0 or np.count_nonzero(scores == scores[best]) > 1:
+            return None
+        return self.contexts[best]
@@ -0,0 +1,125 @@
+"""Adaptive frame scheduling for the moment sensor."""
+from __future__ import annotations
+
+import logging
+import os
+
+from .vote import VOTE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+# Detector input sizes, largest first
+INPUT_SIZES = (608, 416, 320)
+# Time from a change in the room to the moment being reported
+TARGET_LATENCY = 0.6
+MIN_INTERVAL = 0.01
+# Step the input size down above this share of the frame budget
+SLOW_SHARE = 0.8
+# Step it up when the larger size is predicted to stay below this share
+FAST_SHARE = 0.4
+# Idle CPU share needed before stepping up
+MIN_HEADROOM = 0.25
+# Detections to measure before the next size change
+COOLDOWN = 5
+SMOOTHING = 0.2
+
+
+def cpu_headroom() -> float:
+    """Return the idle share of the CPUs from the 1 minute load average.
+
+    The load average counts every process on the box, so the pipelines of
+    the other cameras are included. Returns 1.0 where it is unavailable.
+    """
+    if not hasattr(os, "getloadavg"):
+        return 1.0
+    load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    return min(1.0, max(0.0, 1.0 - load))
+
+
+class AdaptiveScheduler:
+    """Pick the detector input size and the frame interval from measured latency.
+
+    A moment needs frames agreeing votes, so each frame gets target /
+    frames seconds. Frame and detector times are smoothed; the remainder
+    of the budget is slept between frames. When the detector uses most of
+    the budget the input size steps down, and when the next larger size
+    is predicted to fit easily and the CPUs have headroom it steps up.
+    Detector cost is assumed to grow with the input pixel count.
+    """
+
+    def __init__(
+        self,
+        target: float = TARGET_LATENCY,
+        frames: int = VOTE_SIZE,
+        sizes: tuple[int, ...] = INPUT_SIZES,
+        size: int = INPUT_SIZES[1],
+        min_interval: float = MIN_INTERVAL
+    ):
+        """Initializer."""
+        self.budget = target / max(1, frames)
+        self.sizes = tuple(sorted(sizes, reverse=True))
+        if size not in self.sizes:
+            raise ValueError(f"input size {size} is not one of {self.sizes}")
+        self._index = self.sizes.index(size)
+        self.min_interval = min_interval
+
+        self.frame_time: float | None = None
+        self.detect_time: float | None = None
+        self._cooldown = COOLDOWN
+
+    def __repr__(self) -> str:
+        """Return the current schedule."""
+        return (
+            f"AdaptiveScheduler(size={self.size}, interval={self.interval:.3f}, "
+            f"budget={self.budget:.3f}, frame_time={self.frame_time}, "
+            f"detect_time={self.detect_time})"
+        )
+
+    @property
+    def size(self) -> int:
+        """Return the detector input size to use."""
+        return self.sizes[self._index]
+
+    @property
+    def interval(self) -> float:
+        """Return the time to sleep after a frame."""
+        if self.frame_time is None:
+            return self.budget
+        return min(self.budget, max(self.min_interval, self.budget - self.frame_time))
+
+    @staticmethod
+    def _smooth(average: float | None, value: float) -> float:
+        return value if average is None else average + SMOOTHING * (value - average)
+
+    def observe(self, frame_time: float, detect_time: float | None = None) -> int:
+        """Record one frame's processing time and, if it ran, the detector's.
+
+        Returns the input size for the next detection.
+        """
+        self.frame_time = self._smooth(self.frame_time, frame_time)
+        if detect_time is None:
+            return self.size
+
+        self.detect_time = self._smooth(self.detect_time, detect_time)
+        self._cooldown -= 1
+        if self._cooldown > 0:
+            return self.size
+
+        if self.detect_time > SLOW_SHARE * self.budget and self._index + 1 < len(self.sizes):
+            self._resize(self._index + 1)
+        elif self._index > 0:
+            larger = self.detect_time * (self.sizes[self._index - 1] / self.size) ** 2
+            if larger < FAST_SHARE * self.budget and cpu_headroom() >= MIN_HEADROOM:
+                self._resize(self._index - 1)
+        return self.size
+
+    def _resize(self, index: int) -> None:
+        """Switch input size, rescaling the detector time estimate."""
+        size = self.sizes[index]
+        _LOGGER.info(
+            "Detector input %d -> %d (detector %.0f ms of a %.0f ms frame budget)",
+            self.size, size, self.detect_time * 1000, self.budget * 1000
+        )
+        self.detect_time *= (size / self.size) ** 2
+        self._index = index
+        self._cooldown = COOLDOWN
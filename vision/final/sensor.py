@@ -1,5 +1,314 @@
 """Moment sensor."""
+from __future__ import annotations
 
-def run():
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import Any
+
+from .capture import capture_to_ring
+from .detector import DEFAULT_BACKEND
+from .ring import FRAME_SHAPE, RING_SLOTS, SharedFrameRing
+from .roi import ROI_MARGIN, ROI_SIZE
+from .scene import CONTEXTS_FILE, COUNT, SCORING
+from .server import MomentServer
+from .stats import STATS_INTERVAL
+from .vote import VOTE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8080
+RESTART_DELAY = 5
+# Seconds between two checks of the camera processes
+CHECK_INTERVAL = 1.0
+
+
+def parse_source(source: str):
+    """Return a camera index for digit strings, the path or URL otherwise."""
+    return int(source) if source.isdigit() else source
+
+
+def _capture_camera(
+    source,
+    ring_name: str,
+    ring_lock: mp.Lock,
+    shape: tuple[int, int, int],
+    slots: int,
+    stop: mp.Event
+) -> None:
+    """Fill the frame ring of one camera in a capture process."""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        with SharedFrameRing.attach(ring_name, ring_lock, shape, slots) as ring:
+            capture_to_ring(source, ring, stop)
+    except KeyboardInterrupt:
+        pass
+
+
+def _run_camera(
+    camera_id: str,
+    ring_name: str,
+    ring_lock: mp.Lock,
+    shape: tuple[int, int, int],
+    slots: int,
+    options: dict[str, Any],
+    moments: mp.Queue,
+    reports: mp.Queue,
+    stop: mp.Event
+) -> None:
+    """Run the pipeline of one camera on its frame ring in a worker process."""
+    from .pipeline import MomentPipeline
+
+    logging.basicConfig(level=logging.INFO)
+    for option in ("snapshot_dir", "record_dir"):
+        if options.get(option):
+            options = {**options, option: os.path.join(options[option], camera_id)}
+
+    try:
+        with SharedFrameRing.attach(ring_name, ring_lock, shape, slots) as ring, \
+                MomentPipeline(camera_id, **options) as pipeline:
+            pipeline.run(
+                ring,
+                lambda state: moments.put((camera_id, state)),
+                stop=stop,
+                report=lambda stats: reports.put((camera_id, stats.summary()))
+            )
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """Run the processes of every camera behind a single moment server.
+
+    Each camera gets a capture process and a pipeline process, so cameras
+    use separate cores and share no state. Frames go from one to the other
+    through a SharedFrameRing without being pickled. Pipelines send their
+    moments to the supervisor, which publishes them on the server under the
+    camera id. If either process of a camera exits, both are restarted
+    after RESTART_DELAY seconds. Stage latencies reported by the pipelines
+    are served to "stats" requests.
+    """
+
+    def __init__(
+        self,
+        cameras: dict[str, Any],
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        shape: tuple[int, int, int] = FRAME_SHAPE,
+        slots: int = RING_SLOTS,
+        **options
+    ):
+        """Initializer."""
+        self.cameras = cameras
+        self.shape = shape
+        self.slots = slots
+        self.options = options
+        self.server = MomentServer(host, port)
+
+        self._context = mp.get_context("spawn")
+        self._moments = self._context.Queue()
+        self._reports = self._context.Queue()
+        self._rings: dict[str, SharedFrameRing] = {}
+        self._stops: dict[str, mp.Event] = {}
+        self._workers: dict[str, list[mp.Process]] = {}
+        self._restart_at: dict[str, float] = {}
+
+    def _start_camera(self, camera_id: str) -> None:
+        """Start the capture and pipeline processes of one camera."""
+        # A fresh ring on every start: a process stopped while holding the
+        # lock of the old one would leave it locked
+        if camera_id in self._rings:
+            self._rings.pop(camera_id).close()
+        ring = self._rings[camera_id] = SharedFrameRing.create(self.shape, self.slots)
+        stop = self._stops[camera_id] = self._context.Event()
+
+        self._workers[camera_id] = [
+            self._context.Process(
+                target=_capture_camera,
+                args=(self.cameras[camera_id], ring.name, ring.lock, self.shape, self.slots, stop),
+                name=f"capture-{camera_id}",
+                daemon=True
+            ),
+            self._context.Process(
+                target=_run_camera,
+                args=(
+                    camera_id, ring.name, ring.lock, self.shape, self.slots, self.options,
+                    self._moments, self._reports, stop
+                ),
+                name=f"camera-{camera_id}",
+                daemon=True
+            )
+        ]
+        for worker in self._workers[camera_id]:
+            worker.start()
+        _LOGGER.info(
+            "Camera %s started in processes %s",
+            camera_id, [worker.pid for worker in self._workers[camera_id]]
+        )
+
+    def _stop_camera(self, camera_id: str) -> None:
+        """Stop both processes of one camera."""
+        self._stops[camera_id].set()
+        for worker in self._workers[camera_id]:
+            worker.join(timeout=RESTART_DELAY)
+            if worker.is_alive():
+                worker.terminate()
+
+    def _check_workers(self) -> None:
+        """Restart the cameras of which a process exited."""
+        now = time.monotonic()
+        for camera_id, workers in self._workers.items():
+            if all(worker.is_alive() for worker in workers):
+                continue
+            if camera_id not in self._restart_at:
+                _LOGGER.warning(
+                    "Camera %s exited with codes %s",
+                    camera_id, [worker.exitcode for worker in workers]
+                )
+                self._stop_camera(camera_id)
+                self._restart_at[camera_id] = now + RESTART_DELAY
+            elif now >= self._restart_at[camera_id]:
+                del self._restart_at[camera_id]
+                self._start_camera(camera_id)
+
+    def _publish_reports(self) -> None:
+        """Hand the latest stage latencies of every camera to the server."""
+        while True:
+            try:
+                camera_id, summary = self._reports.get_nowait()
+            except queue.Empty:
+                return
+            self.server.publish_stats(summary, camera=camera_id)
+
+    def run(self) -> None:
+        """Serve the moments of every camera until interrupted."""
+        if len(self.cameras) > (os.cpu_count() or 1):
+            _LOGGER.warning(
+                "%d cameras on %d cores, pipelines will compete for CPU",
+                len(self.cameras), os.cpu_count()
+            )
+
+        with self.server:
+            for camera_id in self.cameras:
+                self._start_camera(camera_id)
+
+            try:
+                next_check = time.monotonic() + CHECK_INTERVAL
+                while True:
+                    self._publish_reports()
+                    # Checked on a deadline: while moments keep arriving the
+                    # queue is never empty for long
+                    if time.monotonic() >= next_check:
+                        self._check_workers()
+                        next_check = time.monotonic() + CHECK_INTERVAL
+                    try:
+                        camera_id, state = self._moments.get(timeout=CHECK_INTERVAL)
+                    except queue.Empty:
+                        continue
+                    self.server.publish(state, camera=camera_id)
+            finally:
+                for camera_id in self._workers:
+                    self._stop_camera(camera_id)
+                for ring in self._rings.values():
+                    ring.close()
+
+
+def run(argv: list[str] | None = None) -> int:
     """Run sensor."""
-    print("Hi")
\ No newline at end of file
+    parser = argparse.ArgumentParser(prog="final", description=__doc__)
+    parser.add_argument(
+        "--camera", action="append", default=[], metavar="ID=SOURCE",
+        help="camera index, video file or stream URL, e.g. kitchen=0 (repeatable)"
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--frame-size", default=f"{FRAME_SHAPE[1]}x{FRAME_SHAPE[0]}", metavar="WxH",
+        help="frames are resized to this size before entering the frame ring"
+    )
+    parser.add_argument("--ring-slots", type=int, default=RING_SLOTS)
+    parser.add_argument("--detector", default=DEFAULT_BACKEND)
+    parser.add_argument(
+        "--weights", metavar="PATH",
+        help="weights file or model directory of the detector (default: the backend's own)"
+    )
+    parser.add_argument("--snapshot-dir")
+    parser.add_argument(
+        "--record-dir", help="record landmarks, detections and moments for replay"
+    )
+    parser.add_argument("--warmup", action="store_true")
+    parser.add_argument(
+        "--contexts", default=CONTEXTS_FILE,
+        help="JSON file mapping each moment to the object classes that point to it"
+    )
+    parser.add_argument("--classes", help=".names file of the detector classes, one per line")
+    parser.add_argument(
+        "--roi-size", type=int, metavar="SIZE",
+        help=f"detect objects on a crop around the person at this input size, e.g. {ROI_SIZE}"
+    )
+    parser.add_argument(
+        "--roi-margin", type=float, default=ROI_MARGIN,
+        help="crop margin on every side, as a share of the person's larger side"
+    )
+    parser.add_argument(
+        "--target-latency", type=float, metavar="SECONDS",
+        help="adapt the frame interval and detector input size to report a change within this time"
+    )
+    parser.add_argument(
+        "--stats-interval", type=float, default=STATS_INTERVAL, metavar="SECONDS",
+        help="log and report the stage latencies this often (see python -m final.stats)"
+    )
+    parser.add_argument(
+        "--scoring", choices=SCORING, default=COUNT,
+        help="count objects once, or weight them by confidence, size and distance to the person"
+    )
+    parser.add_argument(
+        "--vote-window", type=int, default=VOTE_SIZE,
+        help="number of recent votes a moment is decided from"
+    )
+    parser.add_argument(
+        "--vote-threshold", type=int,
+        help="votes needed to report a moment (default: the whole window)"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    cameras = {}
+    for camera in args.camera or ["default=0"]:
+        camera_id, sep, source = camera.partition("=")
+        if not sep:
+            parser.error(f"--camera expects ID=SOURCE, got {camera!r}")
+        cameras[camera_id] = parse_source(source)
+
+    width, _, height = args.frame_size.partition("x")
+    supervisor = Supervisor(
+        cameras,
+        args.host,
+        args.port,
+        shape=(int(height), int(width), 3),
+        slots=args.ring_slots,
+        detector=args.detector,
+        weights=args.weights,
+        snapshot_dir=args.snapshot_dir,
+        record_dir=args.record_dir,
+        warmup=args.warmup,
+        vote_window=args.vote_window,
+        vote_threshold=args.vote_threshold,
+        contexts=args.contexts,
+        classes=args.classes,
+        scoring=args.scoring,
+        roi_size=args.roi_size,
+        roi_margin=args.roi_margin,
+        target_latency=args.target_latency,
+        stats_interval=args.stats_interval
+    )
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
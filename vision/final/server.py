@@ -0,0 +1,228 @@
+"""Moment server for the lightme integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any
+
+from . import protocol
+from .stats import PipelineStats
+
+_LOGGER = logging.getLogger(__name__)
+
+START_TIMEOUT = 5
+MAX_WRITE_BUFFER = 1024 * 1024
+DEFAULT_CAMERA = "default"
+# Key of the server's own latencies in "stats" replies
+SERVER_STATS = "server"
+
+
+class MomentServer:
+    """Serve the current moment to lightme over persistent connections.
+
+    The server runs an asyncio loop on its own thread, so the inference
+    loop never waits for a client: publish() only hands over a copy of the
+    state and returns. Any number of clients may stay connected; each
+    sends requests tagged with an id, framed as described in protocol.py,
+    and gets the latest published state back with that id.
+
+    States are published per camera. A request may name a "camera"; one
+    without it gets DEFAULT_CAMERA, or the first camera published if there
+    is none by that name. A "cameras" request returns every camera's state
+    keyed by camera id.
+
+    A client that sends a "subscribe" request is switched to push mode:
+    from then on every change of the published state is sent to it as an
+    event right away, tagged with its camera. Replies and events use the codec of the client's
+    last frame. A client that stops reading is disconnected once its
+    unsent data exceeds MAX_WRITE_BUFFER.
+
+    A "stats" request returns the stage latencies handed to
+    publish_stats() per camera, with the server's own send and reply
+    times under SERVER_STATS.
+
+    Requests are answered right away; a camera that has published
+    nothing yet has a None state.
+    """
+
+    def __init__(self, host: str, port: int):
+        """Initializer."""
+        self.address = (host, port)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._error: OSError | None = None
+
+        self._states: dict[str, dict[str, Any]] = {}
+        self._camera_stats: dict[str, dict[str, Any]] = {}
+        self.stats = PipelineStats()
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._subscribers: dict[asyncio.StreamWriter, tuple[int, str | None]] = {}
+
+    def __enter__(self) -> MomentServer:
+        """Start listening."""
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        """Stop listening."""
+        self.close()
+
+    @property
+    def clients(self) -> int:
+        """Return the number of connected clients."""
+        return len(self._clients)
+
+    def start(self) -> MomentServer:
+        """Bind and listen on a background thread."""
+        self._started.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="moment-server", daemon=True)
+        self._thread.start()
+
+        if not self._started.wait(START_TIMEOUT):
+            raise TimeoutError(f"Moment server did not start on {self.address}")
+        if self._error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._error
+        return self
+
+    def close(self) -> None:
+        """Disconnect every client and stop the server thread."""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def publish(self, state: dict[str, Any], camera: str = DEFAULT_CAMERA) -> None:
+        """Make state the reply to every request for camera from now on.
+
+        Never blocks; subscribed clients get the state pushed if it
+        changed.
+        """
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._set_state, camera, dict(state))
+
+    def publish_stats(self, summary: dict[str, Any], camera: str = DEFAULT_CAMERA) -> None:
+        """Make summary the stage latencies of camera in "stats" replies; never blocks."""
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._set_stats, camera, summary)
+
+    def _run(self) -> None:
+        """Run the event loop of the server thread."""
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            server = loop.run_until_complete(
+                asyncio.start_server(self._async_handle_client, *self.address, reuse_address=True)
+            )
+        except OSError as exc:
+            self._error = exc
+            self._started.set()
+            loop.close()
+            return
+
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            # Closing the streams ends every handler through end of file
+            for writer in list(self._clients):
+                writer.close()
+            tasks = asyncio.all_tasks(loop)
+            if tasks:
+                loop.run_until_complete(asyncio.wait(tasks, timeout=START_TIMEOUT))
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+            self._clients.clear()
+            self._subscribers.clear()
+            self._states.clear()
+            self._camera_stats.clear()
+
+    def _resolve(self, camera: str | None) -> str | None:
+        """Return the camera a request without a known camera refers to."""
+        if camera is not None:
+            return camera
+        if DEFAULT_CAMERA in self._states:
+            return DEFAULT_CAMERA
+        return next(iter(self._states), None)
+
+    def _set_state(self, camera: str, state: dict[str, Any]) -> None:
+        """Store the state of camera and push it to its subscribers if it changed."""
+        if state == self._states.get(camera):
+            return
+        self._states[camera] = state
+
+        start = time.perf_counter()
+        frames: dict[int, bytes] = {}
+        for writer, (codec, subscribed) in list(self._subscribers.items()):
+            if self._resolve(subscribed) != camera:
+                continue
+            if codec not in frames:
+                frames[codec] = protocol.encode(
+                    [{"type": "event", "camera": camera, "data": state}], codec
+                )
+            self._write(writer, frames[codec])
+        if frames:
+            self.stats.record("send", time.perf_counter() - start)
+
+    def _set_stats(self, camera: str, summary: dict[str, Any]) -> None:
+        """Store the stage latencies of camera."""
+        self._camera_stats[camera] = summary
+
+    def _reply(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Return the answer to one request."""
+        if request.get("type") == "cameras":
+            return {"id": request.get("id"), "data": dict(self._states)}
+        if request.get("type") == "stats":
+            return {
+                "id": request.get("id"),
+                "data": {**self._camera_stats, SERVER_STATS: self.stats.summary()}
+            }
+
+        camera = self._resolve(request.get("camera"))
+        return {"id": request.get("id"), "camera": camera, "data": self._states.get(camera)}
+
+    def _write(self, writer: asyncio.StreamWriter, frame: bytes) -> None:
+        """Queue a frame, dropping the client if it is not keeping up."""
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            _LOGGER.info("Client %s is not reading, dropping it", writer.get_extra_info("peername"))
+            self._subscribers.pop(writer, None)
+            writer.close()
+            return
+        writer.write(frame)
+
+    async def _async_handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of one client until it disconnects."""
+        client_addr = writer.get_extra_info("peername")
+        _LOGGER.info("Client %s connected", client_addr)
+        self._clients.add(writer)
+
+        try:
+            while True:
+                codec, requests = await protocol.async_read_messages(reader)
+                start = time.perf_counter()
+                replies = []
+                for request in requests:
+                    if request.get("type") == "subscribe":
+                        self._subscribers[writer] = (codec, request.get("camera"))
+                    replies.append(self._reply(request))
+
+                if writer in self._subscribers:
+                    self._subscribers[writer] = (codec, self._subscribers[writer][1])
+                self._write(writer, protocol.encode(replies, codec))
+                self.stats.record("reply", time.perf_counter() - start)
+                await writer.drain()
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            _LOGGER.info("Client %s dropped: %s", client_addr, exc)
+        finally:
+            self._clients.discard(writer)
+            self._subscribers.pop(writer, None)
+            writer.close()
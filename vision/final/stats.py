@@ -0,0 +1,200 @@
+"""Per-stage latency statistics for the moment sensor.
+
+Run ``python -m final.stats`` next to a running sensor to print the
+latency of every stage of every camera.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import math
+import socket
+import sys
+import time
+from collections.abc import Iterator
+
+import numpy as np
+
+from . import protocol
+
+# Recordable range and relative precision, HdrHistogram style
+LOWEST = 1e-6
+HIGHEST = 100.0
+PRECISION = 0.01
+PERCENTILES = (50, 90, 99)
+# Seconds between two dumps of the statistics to the log
+STATS_INTERVAL = 60.0
+
+
+class LatencyHistogram:
+    """Count latencies in logarithmic buckets of constant relative width.
+
+    Every recorded value is known to within PRECISION of its size from
+    LOWEST to HIGHEST seconds, whatever the spread, at a fixed memory cost
+    and O(1) per record. Values outside the range are clamped into it;
+    the exact minimum, maximum and total are kept on the side.
+    """
+
+    def __init__(
+        self,
+        lowest: float = LOWEST,
+        highest: float = HIGHEST,
+        precision: float = PRECISION
+    ):
+        """Initializer."""
+        self.lowest = lowest
+        self._scale = 1.0 / math.log1p(precision)
+        self._last = self._index(highest)
+        # A list is cheaper than an array to bump one element of
+        self.counts = [0] * (self._last + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def __repr__(self) -> str:
+        """Return the count and main percentiles."""
+        return f"LatencyHistogram({self.format()})"
+
+    def _index(self, seconds: float) -> int:
+        """Return the bucket of seconds."""
+        if seconds <= self.lowest:
+            return 0
+        return int(math.log(seconds / self.lowest) * self._scale)
+
+    def _value(self, index: int) -> float:
+        """Return the upper edge of bucket index."""
+        return self.lowest * math.exp((index + 1) / self._scale)
+
+    def record(self, seconds: float) -> None:
+        """Count one latency."""
+        index = self._index(seconds)
+        self.counts[index if index < self._last else self._last] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """Add the counts of a histogram with the same range and precision."""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        """Return the mean latency in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Return the latency under which percent of the values lie, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(max(self._value(index), self.min), self.max)
+
+    def summary(self) -> dict[str, float]:
+        """Return the count and the mean, percentiles and maximum in ms."""
+        summary = {"count": self.count, "mean": round(self.mean * 1000, 3)}
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = round(self.percentile(percent) * 1000, 3)
+        summary["max"] = round(self.max * 1000, 3)
+        return summary
+
+    def format(self) -> str:
+        """Return the summary on one line."""
+        summary = self.summary()
+        values = " ".join(f"{key} {summary[key]:.1f}" for key in summary if key != "count")
+        return f"n={self.count} {values} ms"
+
+
+class PipelineStats:
+    """One LatencyHistogram per named pipeline stage."""
+
+    def __init__(self):
+        """Initializer."""
+        self.histograms: dict[str, LatencyHistogram] = {}
+
+    def __repr__(self) -> str:
+        """Return the stages."""
+        return f"PipelineStats({list(self.histograms)})"
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Count one latency of stage."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Record the time spent in the with block as one latency of stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Return the summary of every stage."""
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def format(self) -> str:
+        """Return one line per stage."""
+        width = max((len(stage) for stage in self.histograms), default=0)
+        return "\n".join(
+            f"  {stage:{width}s}  {histogram.format()}"
+            for stage, histogram in self.histograms.items()
+        )
+
+
+def timed(stats: PipelineStats | None, stage: str):
+    """Return stats.time(stage), or a no-op context without stats."""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.time(stage)
+
+
+def fetch(host: str, port: int, timeout: float = 5.0) -> dict[str, dict]:
+    """Return the stage summaries of every camera from a running sensor."""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(protocol.encode([{"id": 1, "type": "stats"}]))
+        decoder = protocol.FrameDecoder()
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("Sensor closed the connection")
+            for message in decoder.feed(data):
+                if message.get("id") == 1:
+                    return message["data"]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Print the latency statistics of a running sensor."""
+    parser = argparse.ArgumentParser(prog="python -m final.stats", description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--json", action="store_true", help="print the raw summaries")
+    args = parser.parse_args(argv)
+
+    cameras = fetch(args.host, args.port)
+    if args.json:
+        print(json.dumps(cameras, indent=2))
+        return 0
+
+    for camera, stages in cameras.items():
+        print(camera)
+        for stage, summary in stages.items():
+            values = "  ".join(f"{key} {value:>9}" for key, value in summary.items())
+            print(f"  {stage:10s}  {values}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
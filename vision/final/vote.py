@@ -0,0 +1,119 @@
+"""Temporal smoothing of per-frame votes for the moment sensor."""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+VOTE_SIZE = 3
+
+
+class MajorityVote:
+    """Sliding-window vote with hysteresis over the last window labels.
+
+    A label wins once threshold of the votes in the window agree on it and
+    keeps winning until its count drops below release. With threshold equal
+    to window and no release, this is the original "last three votes agree"
+    rule; lowering threshold trades stability for decision latency.
+
+    Votes live in a fixed-size deque with a running count per label, so
+    push() is O(1) however large the window. When several labels reach
+    threshold at once, the first of priority wins.
+    """
+
+    def __init__(
+        self,
+        window: int = VOTE_SIZE,
+        threshold: int | None = None,
+        release: int | None = None,
+        priority: Iterable[str] = ()
+    ):
+        """Initializer."""
+        if window < 1:
+            raise ValueError(f"window must be positive, got {window}")
+        self.window = window
+        self.threshold = window if threshold is None else threshold
+        self.release = self.threshold if release is None else release
+        if not 0 < self.release <= self.threshold <= window:
+            raise ValueError(
+                f"need 0 < release <= threshold <= window, got "
+                f"{self.release}, {self.threshold}, {window}"
+            )
+        self.priority = tuple(priority)
+        self._rank = {label: rank for rank, label in enumerate(self.priority)}
+
+        self._votes: deque[str] = deque(maxlen=window)
+        self._counts: dict[str, int] = {}
+        # Labels with at least threshold votes
+        self._leaders: set[str] = set()
+        self._winner: str | None = None
+
+    def __repr__(self) -> str:
+        """Return the window and the running counts."""
+        return (
+            f"MajorityVote(window={self.window}, threshold={self.threshold}, "
+            f"release={self.release}, counts={self._counts}, winner={self._winner!r})"
+        )
+
+    def __len__(self) -> int:
+        """Return the number of votes in the window."""
+        return len(self._votes)
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield the votes in the window, newest first."""
+        return reversed(self._votes)
+
+    def _add(self, label: str, delta: int) -> None:
+        """Change the running count of label."""
+        count = self._counts.get(label, 0) + delta
+        if count:
+            self._counts[label] = count
+        else:
+            del self._counts[label]
+
+        if count >= self.threshold:
+            self._leaders.add(label)
+        else:
+            self._leaders.discard(label)
+
+    def push(self, label: str) -> str | None:
+        """Add one vote, evicting the oldest once the window is full; return the winner."""
+        if len(self._votes) == self.window:
+            self._add(self._votes[0], -1)
+        self._votes.append(label)
+        self._add(label, 1)
+        return self._update()
+
+    def _update(self) -> str | None:
+        """Pick the winner from the running counts."""
+        if self._leaders:
+            if self._winner not in self._leaders:
+                self._winner = min(
+                    self._leaders, key=lambda label: self._rank.get(label, len(self._rank))
+                )
+        elif self._counts.get(self._winner, 0) < self.release:
+            self._winner = None
+        return self._winner
+
+    @property
+    def winner(self) -> str | None:
+        """Return the label currently winning the vote, if any."""
+        return self._winner
+
+    def count(self, label: str) -> int:
+        """Return the votes for label in the window."""
+        return self._counts.get(label, 0)
+
+    def confidence(self, label: str | None = None) -> float:
+        """Return the share of the window voting for label, by default the winner."""
+        if label is None:
+            label = self._winner
+        if label is None:
+            return 0.0
+        return self._counts.get(label, 0) / self.window
+
+    def clear(self) -> None:
+        """Forget every vote."""
+        self._votes.clear()
+        self._counts.clear()
+        self._leaders.clear()
+        self._winner = None
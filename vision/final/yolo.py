@@ -0,0 +1,116 @@
+"""YOLO output decoding for the moment sensor."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+CONF_THRESHOLD = 0.5
+NMS_SCORE_THRESHOLD = 0.1
+NMS_THRESHOLD = 0.4
+
+
+@dataclass(frozen=True)
+class Detections:
+    """Compact detection arrays.
+
+    boxes are (N, 4) int32 rows of x, y, w, h in frame pixels, scores are
+    (N,) float32 confidences and class_ids are (N,) int32 COCO ids.
+    """
+
+    boxes: np.ndarray
+    scores: np.ndarray
+    class_ids: np.ndarray
+
+    def __len__(self) -> int:
+        """Return the number of detections."""
+        return len(self.scores)
+
+    @classmethod
+    def empty(cls) -> Detections:
+        """Return an empty detection set."""
+        return cls(
+            np.zeros((0, 4), dtype=np.int32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int32)
+        )
+
+    def take(self, indices: np.ndarray) -> Detections:
+        """Return the detections at the given indices as a compact copy.
+
+        Indexing by an index array always copies, so the result owns its
+        arrays and holds no reference to the full detection set.
+        """
+        return Detections(
+            self.boxes[indices],
+            self.scores[indices],
+            self.class_ids[indices]
+        )
+
+    def translate(self, x: int, y: int) -> Detections:
+        """Return the detections with their boxes moved by x, y pixels."""
+        return Detections(
+            self.boxes + np.array([x, y, 0, 0], dtype=self.boxes.dtype),
+            self.scores,
+            self.class_ids
+        )
+
+
+def decode_outputs(
+    outs,
+    width: int,
+    height: int,
+    conf_threshold: float = CONF_THRESHOLD
+) -> Detections:
+    """Decode cv2.dnn YOLO output layers into compact detection arrays.
+
+    Each output row is cx, cy, w, h, objectness followed by the class
+    scores, all relative to the input size. Rows whose best class score
+    does not exceed conf_threshold are dropped before any box math.
+    """
+    out = np.concatenate(outs, axis=0) if len(outs) > 1 else np.asarray(outs[0])
+    out = out.reshape(-1, out.shape[-1])
+
+    class_scores = out[:, 5:]
+    confidences = class_scores.max(axis=1)
+    keep = np.flatnonzero(confidences > conf_threshold)
+    if keep.size == 0:
+        return Detections.empty()
+
+    rows = out[keep]
+    class_ids = class_scores[keep].argmax(axis=1).astype(np.int32)
+
+    # int() truncation of the original per-detection loop
+    center_x = (rows[:, 0] * width).astype(np.int32)
+    center_y = (rows[:, 1] * height).astype(np.int32)
+    w = (rows[:, 2] * width).astype(np.int32)
+    h = (rows[:, 3] * height).astype(np.int32)
+    x = (center_x - w / 2).astype(np.int32)
+    y = (center_y - h / 2).astype(np.int32)
+
+    return Detections(
+        np.stack((x, y, w, h), axis=1),
+        confidences[keep].astype(np.float32),
+        class_ids
+    )
+
+
+def nms(
+    detections: Detections,
+    score_threshold: float = NMS_SCORE_THRESHOLD,
+    nms_threshold: float = NMS_THRESHOLD
+) -> np.ndarray:
+    """Return the indices kept by non-maximum suppression.
+
+    The indices come back as a flat, ascending intp array so they can be
+    used to index the detection arrays directly and keep the original
+    detection order.
+    """
+    if not len(detections):
+        return np.zeros(0, dtype=np.intp)
+
+    indexes = cv2.dnn.NMSBoxes(
+        detections.boxes, detections.scores, score_threshold, nms_threshold
+    )
+    return np.sort(np.asarray(indexes, dtype=np.intp).reshape(-1))
@@ -5,10 +5,15 @@ if len(physical_devices) > 0:
 from absl import app, flags, logging
 from absl.flags import FLAGS
 import core.utils as utils
-from core.yolov4 import filter_boxes
 from tensorflow.python.saved_model import tag_constants
 from PIL import Image
 import cv2
+import collections
+import glob
+import json
+import os
+import threading
+import time
 import numpy as np
 from tensorflow.compat.v1 import ConfigProto
 from tensorflow.compat.v1 import InteractiveSession
@@ -23,28 +28,22 @@ flags.DEFINE_string('image', './data/kite.jpg', 'path to input image')
 flags.DEFINE_string('output', 'result.png', 'path to output image')
 flags.DEFINE_float('iou', 0.45, 'iou threshold')
 flags.DEFINE_float('score', 0.25, 'score threshold')
+flags.DEFINE_string('input', None, 'batch mode: directory, glob or video of images')
+flags.DEFINE_integer('batch_size', 8, 'batch mode: images per inference call')
+flags.DEFINE_string('output_dir', './detections', 'batch mode: where results are written')
+flags.DEFINE_string('video', None, 'video mode: video file or camera index')
+flags.DEFINE_string('video_output', 'result.mp4', 'video mode: annotated output video')
+flags.DEFINE_integer('queue_size', 4, 'video mode: frames buffered between stages')
+flags.DEFINE_boolean('drop_frames', True, 'video mode: drop the oldest frame when a stage falls behind')
+# filter_batch marks filtered rows with FILTERED_SCORE, which only a positive threshold rejects
+flags.register_validator('score', lambda score: score > 0, message='--score must be above 0')
 
-def main(_argv):
-    config = ConfigProto()
-    config.gpu_options.allow_growth = True
-    session = InteractiveSession(config=config)
-    STRIDES, ANCHORS, NUM_CLASS, XYSCALE = utils.load_config(FLAGS)
-    input_size = FLAGS.size
-    image_path = FLAGS.image
-
-    original_image = cv2.imread(image_path)
-    original_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
-
-    # image_data = utils.image_preprocess(np.copy(original_image), [input_size, input_size])
-    image_data = cv2.resize(original_image, (input_size, input_size))
-    image_data = image_data / 255.
-    # image_data = image_data[np.newaxis, ...].astype(np.float32)
-
-    images_data = []
-    for i in range(1):
-        images_data.append(image_data)
-    images_data = np.asarray(images_data).astype(np.float32)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+FILTERED_SCORE = -1.
 
+def build_predictor(input_size):
+    # load the model once and return predict(images_data) -> (boxes, pred_conf)
     if FLAGS.framework == 'tflite':
         interpreter = tf.lite.Interpreter(model_path=FLAGS.weights)
         interpreter.allocate_tensors()
@@ -52,22 +51,56 @@ def main(_argv):
         output_details = interpreter.get_output_details()
         print(input_details)
         print(output_details)
-        interpreter.set_tensor(input_details[0]['index'], images_data)
-        interpreter.invoke()
-        pred = [interpreter.get_tensor(output_details[i]['index']) for i in range(len(output_details))]
-        if FLAGS.model == 'yolov3' and FLAGS.tiny == True:
-            boxes, pred_conf = filter_boxes(pred[1], pred[0], score_threshold=0.25, input_shape=tf.constant([input_size, input_size]))
-        else:
-            boxes, pred_conf = filter_boxes(pred[0], pred[1], score_threshold=0.25, input_shape=tf.constant([input_size, input_size]))
+
+        def predict(images_data):
+            # the interpreter is resized whenever the batch size changes
+            if interpreter.get_input_details()[0]['shape'][0] != len(images_data):
+                interpreter.resize_tensor_input(input_details[0]['index'], images_data.shape)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_details[0]['index'], images_data)
+            interpreter.invoke()
+            pred = [interpreter.get_tensor(output_details[i]['index']) for i in range(len(output_details))]
+            if FLAGS.model == 'yolov3' and FLAGS.tiny == True:
+                return filter_batch(pred[1], pred[0], score_threshold=0.25, input_size=input_size)
+            return filter_batch(pred[0], pred[1], score_threshold=0.25, input_size=input_size)
     else:
         saved_model_loaded = tf.saved_model.load(FLAGS.weights, tags=[tag_constants.SERVING])
         infer = saved_model_loaded.signatures['serving_default']
-        batch_data = tf.constant(images_data)
-        pred_bbox = infer(batch_data)
-        for key, value in pred_bbox.items():
-            boxes = value[:, :, 0:4]
-            pred_conf = value[:, :, 4:]
 
+        def predict(images_data):
+            batch_data = tf.constant(images_data)
+            pred_bbox = infer(batch_data)
+            for key, value in pred_bbox.items():
+                boxes = value[:, :, 0:4]
+                pred_conf = value[:, :, 4:]
+            return boxes, pred_conf
+
+    return predict
+
+def filter_batch(box_xywh, scores, score_threshold, input_size):
+    # filter_boxes for a batch: boolean_mask would pool the surviving rows of all
+    # images and split them back evenly, moving boxes between images. Scores below
+    # the threshold are set to FILTERED_SCORE instead, so the (N, boxes, classes)
+    # shape is kept and run_nms drops them per image.
+    keep = tf.reduce_max(scores, axis=-1, keepdims=True) >= score_threshold
+    pred_conf = tf.where(keep, scores, tf.fill(tf.shape(scores), FILTERED_SCORE))
+
+    # xywh in input pixels -> normalized y1, x1, y2, x2
+    box_xy, box_wh = tf.split(box_xywh, (2, 2), axis=-1)
+    box_yx = box_xy[..., ::-1]
+    box_hw = box_wh[..., ::-1]
+    input_shape = tf.constant([input_size, input_size], dtype=tf.float32)
+    box_mins = (box_yx - box_hw / 2.) / input_shape
+    box_maxes = (box_yx + box_hw / 2.) / input_shape
+    boxes = tf.concat([box_mins, box_maxes], axis=-1)
+    return boxes, pred_conf
+
+def preprocess(original_image, input_size):
+    # RGB image -> (size, size, 3) network input
+    image_data = cv2.resize(original_image, (input_size, input_size))
+    return image_data / 255.
+
+def run_nms(boxes, pred_conf):
     boxes, scores, classes, valid_detections = tf.image.combined_non_max_suppression(
         boxes=tf.reshape(boxes, (tf.shape(boxes)[0], -1, 1, 4)),
         scores=tf.reshape(
@@ -77,7 +110,217 @@ def main(_argv):
         iou_threshold=FLAGS.iou,
         score_threshold=FLAGS.score
     )
-    pred_bbox = [boxes.numpy(), scores.numpy(), classes.numpy(), valid_detections.numpy()]
+    return [boxes.numpy(), scores.numpy(), classes.numpy(), valid_detections.numpy()]
+
+def iter_inputs(path):
+    # yield (name, RGB image) from a directory, a glob pattern or a video
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    elif path.lower().endswith(VIDEO_EXTENSIONS):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        capture = cv2.VideoCapture(path)
+        index = 0
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield '{}_{:06d}'.format(stem, index), cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+        capture.release()
+        return
+    else:
+        paths = sorted(glob.glob(path))
+
+    for image_path in paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            logging.warning('skipping unreadable image %s', image_path)
+            continue
+        yield os.path.splitext(os.path.basename(image_path))[0], cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_batches(predict, input_size):
+    # batch mode: N images per inference call, results streamed to output_dir
+    os.makedirs(FLAGS.output_dir, exist_ok=True)
+    count = 0
+
+    with open(os.path.join(FLAGS.output_dir, 'detections.jsonl'), 'a') as result_file:
+        for batch in iter_batches(iter_inputs(FLAGS.input), max(1, FLAGS.batch_size)):
+            images_data = np.asarray(
+                [preprocess(image, input_size) for _, image in batch]
+            ).astype(np.float32)
+
+            boxes, pred_conf = predict(images_data)
+            pred_bbox = run_nms(boxes, pred_conf)
+
+            for i, (name, original_image) in enumerate(batch):
+                valid = int(pred_bbox[3][i])
+                result_file.write(json.dumps({
+                    'image': name,
+                    'boxes': pred_bbox[0][i, :valid].tolist(),
+                    'scores': pred_bbox[1][i, :valid].tolist(),
+                    'classes': pred_bbox[2][i, :valid].astype(int).tolist()
+                }) + '\n')
+
+                image = utils.draw_bbox(original_image, [value[i:i + 1] for value in pred_bbox])
+                image = cv2.cvtColor(np.asarray(image).astype(np.uint8), cv2.COLOR_RGB2BGR)
+                cv2.imwrite(os.path.join(FLAGS.output_dir, name + '.jpg'), image)
+
+            result_file.flush()
+            count += len(batch)
+            logging.info('%d images processed', count)
+
+class FrameQueue:
+    # bounded queue between video stages; when full, put() drops the oldest
+    # frame (drop_oldest=True) or waits for the consumer (back-pressure)
+    def __init__(self, maxsize, drop_oldest=True):
+        self.maxsize = max(1, maxsize)
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        # returns False, dropping item, once the queue is closed
+        with self._cond:
+            if not self.drop_oldest:
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed)
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self):
+        # returns None once the queue is closed and drained
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+def run_video(predict, input_size):
+    # video mode: decode -> infer -> encode, each stage on its own thread
+    source = int(FLAGS.video) if FLAGS.video.isdigit() else FLAGS.video
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError('cannot open video {}'.format(FLAGS.video))
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(FLAGS.video_output, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+
+    decoded = FrameQueue(FLAGS.queue_size, FLAGS.drop_frames)
+    annotated = FrameQueue(FLAGS.queue_size, FLAGS.drop_frames)
+    stats = {'decoded': 0, 'inferred': 0, 'encoded': 0}
+
+    def decode():
+        # stops at the end of the video, or once the inference loop closes the
+        # queue; a camera never runs out of frames
+        while True:
+            ret, frame = capture.read()
+            if not ret or not decoded.put(frame):
+                break
+            stats['decoded'] += 1
+        decoded.close()
+
+    def encode():
+        while True:
+            frame = annotated.get()
+            if frame is None:
+                break
+            writer.write(frame)
+            stats['encoded'] += 1
+
+    threads = [threading.Thread(target=decode, daemon=True), threading.Thread(target=encode, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    try:
+        while True:
+            frame = decoded.get()
+            if frame is None:
+                break
+            original_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            images_data = np.asarray([preprocess(original_image, input_size)]).astype(np.float32)
+
+            boxes, pred_conf = predict(images_data)
+            image = utils.draw_bbox(original_image, run_nms(boxes, pred_conf))
+            annotated.put(cv2.cvtColor(np.asarray(image).astype(np.uint8), cv2.COLOR_RGB2BGR))
+
+            stats['inferred'] += 1
+            if stats['inferred'] % 100 == 0:
+                logging.info('%d frames, %.1f fps', stats['inferred'], stats['inferred'] / (time.perf_counter() - start))
+    finally:
+        elapsed = time.perf_counter() - start
+        decoded.close()
+        annotated.close()
+        for thread in threads:
+            thread.join()
+        capture.release()
+        writer.release()
+
+    logging.info(
+        'decoded %d, inferred %d, encoded %d frames (dropped %d before inference, %d before encoding)',
+        stats['decoded'], stats['inferred'], stats['encoded'], decoded.dropped, annotated.dropped
+    )
+    logging.info('sustained %.1f fps over %.1f s', stats['inferred'] / elapsed if elapsed else 0.0, elapsed)
+
+def main(_argv):
+    config = ConfigProto()
+    config.gpu_options.allow_growth = True
+    session = InteractiveSession(config=config)
+    STRIDES, ANCHORS, NUM_CLASS, XYSCALE = utils.load_config(FLAGS)
+    input_size = FLAGS.size
+
+    predict = build_predictor(input_size)
+
+    if FLAGS.video:
+        run_video(predict, input_size)
+        return
+
+    if FLAGS.input:
+        run_batches(predict, input_size)
+        return
+
+    image_path = FLAGS.image
+
+    original_image = cv2.imread(image_path)
+    original_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
+
+    # image_data = utils.image_preprocess(np.copy(original_image), [input_size, input_size])
+    image_data = preprocess(original_image, input_size)
+    # image_data = image_data[np.newaxis, ...].astype(np.float32)
+
+    images_data = np.asarray([image_data]).astype(np.float32)
+
+    boxes, pred_conf = predict(images_data)
+    pred_bbox = run_nms(boxes, pred_conf)
     image = utils.draw_bbox(original_image, pred_bbox)
     # image = utils.draw_bbox(image_data*255, pred_bbox)
     image = Image.fromarray(image.astype(np.uint8))
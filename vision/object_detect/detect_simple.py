@@ -1,6 +1,6 @@
-import tensorflow as tf
-import core.utils as utils
-from tensorflow.python.saved_model import tag_constants
+import argparse
+import os
+
 import cv2
 import numpy as np
 
@@ -9,15 +9,37 @@ IOU_THRESHOLD = 0.45
 SCORE_THRESHOLD = 0.25
 INPUT_SIZE = 416
 
-# load model
-saved_model_loaded = tf.saved_model.load(MODEL_PATH, tags=[tag_constants.SERVING])
-infer = saved_model_loaded.signatures['serving_default']
+# loaded models, keyed by (model path, input size)
+_MODEL_CACHE = {}
+
+def get_infer(model_path=MODEL_PATH, input_size=INPUT_SIZE):
+    # load model on first use (tensorflow is imported here, not at import time)
+    key = (os.path.abspath(model_path), input_size)
+    if key not in _MODEL_CACHE:
+        import tensorflow as tf
+        from tensorflow.python.saved_model import tag_constants
+
+        saved_model_loaded = tf.saved_model.load(model_path, tags=[tag_constants.SERVING])
+        _MODEL_CACHE[key] = saved_model_loaded.signatures['serving_default']
+    return _MODEL_CACHE[key]
+
+def warmup(model_path=MODEL_PATH, input_size=INPUT_SIZE):
+    # dummy inference so the graph is traced before the first real image
+    import tensorflow as tf
+
+    infer = get_infer(model_path, input_size)
+    infer(tf.zeros((1, input_size, input_size, 3), dtype=tf.float32))
+
+def main(img_path, model_path=MODEL_PATH, input_size=INPUT_SIZE):
+    import tensorflow as tf
+    import core.utils as utils
+
+    infer = get_infer(model_path, input_size)
 
-def main(img_path):
     img = cv2.imread(img_path)
     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-    img_input = cv2.resize(img, (INPUT_SIZE, INPUT_SIZE))
+    img_input = cv2.resize(img, (input_size, input_size))
     img_input = img_input / 255.
     img_input = img_input[np.newaxis, ...].astype(np.float32)
     img_input = tf.constant(img_input)
@@ -45,5 +67,13 @@ def main(img_path):
     cv2.imwrite('result.png', result)
 
 if __name__ == '__main__':
-    img_path = './data/kite.jpg'
-    main(img_path)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image', nargs='?', default='./data/kite.jpg')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--size', type=int, default=INPUT_SIZE)
+    parser.add_argument('--warmup', action='store_true', help='run a dummy inference before the first image')
+    args = parser.parse_args()
+
+    if args.warmup:
+        warmup(args.model, args.size)
+    main(args.image, args.model, args.size)
@@ -1,8 +1,14 @@
+import os
+import sys
+
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import mediapipe as mp
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from final.yolo import decode_outputs, nms
+
 classes = ["person", "bicycle", "car", "motorcycle",
             "airplane", "bus", "train", "truck", "boat", "traffic light", "fire hydrant",
             "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse",
@@ -36,43 +42,28 @@ blob = cv2.dnn.blobFromImage(img, 0.00392, (416, 416), (0, 0, 0), True, crop=Fal
 net.setInput(blob)
 outs = net.forward(output_layers)
 
-class_ids = []
-confidences = []
-boxes = []
-for out in outs:
-    for detection in out:
-        scores = detection[5:]
-        class_id = np.argmax(scores)
-        confidence = scores[class_id]
-
-        if confidence > 0.5:
-            center_x = int(detection[0] * width)
-            center_y = int(detection[1] * height)
-            w = int(detection[2] * width)
-            h = int(detection[3] * height)
-
-            x = int(center_x - w / 2)
-            y = int(center_y - h / 2)
-            boxes.append([x, y, w, h])
-            confidences.append(float(confidence))
-            class_ids.append(class_id)
+#출력 텐서 전체를 한 번에 디코딩
+detections = decode_outputs(outs, width, height)
+boxes = detections.boxes
+confidences = detections.scores
+class_ids = detections.class_ids
 
 
 class_in = []
 box = []
 
-indexes = cv2.dnn.NMSBoxes(boxes, confidences, 0.1, 0.4)
+indexes = nms(detections)
 
 font = cv2.FONT_HERSHEY_PLAIN
-for i in range(len(boxes)):
-    if i in indexes:
-        x, y, w, h = boxes[i]
-        label = str(classes[class_ids[i]])
-        print(f"class_ids: {label} x : {x} y : {y}")
-        color = colors[i]
-        cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
-        cv2.putText(img, label, (x, y+30), font, 2, color, 2)
-        
+#NMS 로 남은 검출만 바로 인덱싱
+for i in indexes:
+    x, y, w, h = boxes[i]
+    label = str(classes[class_ids[i]])
+    print(f"class_ids: {label} x : {x} y : {y}")
+    color = colors[i]
+    cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
+    cv2.putText(img, label, (x, y+30), font, 2, color, 2)
+    
 cv2.imshow("Image", img)
 cv2.waitKey(0)
 cv2.destroyAllWindows()
\ No newline at end of file
@@ -1,6 +1,7 @@
 # echo_server.py
 #-*- coding:utf-8 -*-
 import os
+import sys
 
 import socket
 import json
@@ -10,6 +11,10 @@ import mediapipe as mp
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from final.vote import MajorityVote
+
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
@@ -92,7 +97,8 @@ motion = "initial"
 
 
 
-NOW = []
+#최근 3 표가 모두 같으면 상황 결정 (work > media > meal > sleep 순)
+NOW = MajorityVote(3, priority=("work", "media", "meal", "sleep"))
 
 
 
@@ -238,15 +244,15 @@ while temp.isOpened():
      
             # meal
             if meal_check > 0:
-                NOW.insert(0, "meal")
+                NOW.push("meal")
                             
             else :
                 
                 if score_con > 0:
-                    NOW.insert(0, "work")
+                    NOW.push("work")
                     
                 elif score_con < 0:
-                    NOW.insert(0, "media")
+                    NOW.push("media")
                     
                 else:
                     print( "Try again => " + stage["CurrentMoment"] )
@@ -254,7 +260,7 @@ while temp.isOpened():
 
         #동작2 lie -> sleep
         elif motion == "lie":
-            NOW.insert(0, "sleep")
+            NOW.push("sleep")
 
 
         #동작3 stand -> 전 상태 유지
@@ -274,28 +280,16 @@ while temp.isOpened():
 
  
                 
-    if(len(NOW) > 3):
-        print("pop")
-        NOW.pop()
-        
-    print(NOW)
+    #오래된 표는 push 할 때 자동으로 빠짐
+    print(list(NOW))
     
     
     
         
         
     
-    if(NOW.count("work")  == 3):
-        stage["CurrentMoment"] = "work"
-        
-    elif(NOW.count("media")  == 3):
-        stage["CurrentMoment"] = "media"
-        
-    elif(NOW.count("meal")  == 3):
-        stage["CurrentMoment"] = "meal"
-        
-    elif(NOW.count("sleep")  == 3):
-        stage["CurrentMoment"] = "sleep"
+    if NOW.winner is not None:
+        stage["CurrentMoment"] = NOW.winner
         
         
         
@@ -10,6 +10,17 @@ import mediapipe as mp
 import cv2
 import numpy as np
 
+from final.capture import CaptureStage
+from final.features import (
+    LEFT_HIP_ANGLE, LEFT_KNEE_ANGLE, LEFT_KNEE_HIP_DY, LEFT_SHOULDER_HIP_DY,
+    RIGHT_HIP_ANGLE, RIGHT_KNEE_ANGLE, RIGHT_KNEE_HIP_DY, RIGHT_SHOULDER_HIP_DY,
+    landmarks_to_array, pose_features
+)
+from final.frame import SnapshotWriter
+from final.pose import PoseEstimator
+from final.vote import MajorityVote
+from final.yolo import decode_outputs, nms
+
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
@@ -46,31 +57,10 @@ layer_names = net.getLayerNames()
 output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
 colors = np.random.uniform(0, 255, size=(len(classes), 3))
 
+# 디버그용 스냅샷 (MOMENT_SNAPSHOT_DIR 지정 시에만 저장)
+snapshot = SnapshotWriter(os.environ.get("MOMENT_SNAPSHOT_DIR"))
 
-#calculate angles
-def calculate_angle(a, b, c):
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-                
-    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-    angle = np.abs(radians*180.0/np.pi)
-                
-    if angle > 180.0:
-        angle = 360-angle
-                    
-    return angle
-        
-#calculate Y diff
-def calculate_Y_diff_abs(a, b):
-    a = np.array(a)[1]
-    b = np.array(b)[1]
-    return abs(a-b)
 
-def calculate_Y_diff(a, b):
-    a = np.array(a)[1]
-    b = np.array(b)[1]
-    return (a-b)
 
 
 
@@ -85,14 +75,15 @@ stage = {
     "CurrentMoment" : "test currnet",
     "UpcomingMoment": "test upcoming"
 }
-temp = cv2.VideoCapture(0) #카메라
+capture = CaptureStage(0).start() #카메라 (별도 스레드에서 촬영)
 stage['CurrentMoment'] = "Initial"
 result = json.dumps(stage)
 motion = "-"
 
 state_cnt = 0
 
-NOW = []
+#최근 3 표 중 3 표가 같으면 상황 결정 (work > media > meal > sleep 순)
+NOW = MajorityVote(3, priority=("work", "media", "meal", "sleep"))
 
 present = []
 past = []
@@ -104,279 +95,242 @@ work_cnt = 0
 
 
 
+#pose 세션 (루프 밖에서 한 번만 생성)
+pose = PoseEstimator(min_detection_confidence=0.5, min_tracking_confidence=0.5).open()
+pose.warmup()
+
 # 루프 진입
-while temp.isOpened():    
+while capture.running:    
     
-    #setup mp
-    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:          
+
+    
+    #최신 프레임 한 장을 pose / yolo 가 함께 사용
+    frame = capture.latest(timeout=1.0)
+    if frame is None:
+        continue
+
+    #make detection (RGB)
+    results = pose.process(frame.rgb)
     
+    #extract landmarks
+    try:
+        # 33개 landmark 를 (33, 4) 배열로 한 번에 변환 후 각도 / Y 차이를 한꺼번에 계산
+        features = pose_features(landmarks_to_array(results.pose_landmarks.landmark))
         
-        #사진 촬영
-        temp_ret, temp_frame = temp.read()
-        #사진 저장
-        cv2.imwrite("temp.png", temp_frame)
-        time.sleep(0.5)
-        #저장된 이미지
-        img = cv2.imread("temp.png") 
-        ret, frame = temp.read()
-            
-        #recolor image to RGB
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
-        #make detection
-        results = pose.process(image)
-        #recoloring back to BGR
-        image.flags.writeable = True
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        
-        #extract landmarks
-        try:
-            landmarks = results.pose_landmarks.landmark
-            
-            # Get coordinates
-            right_shoulder = [landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x,landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-            left_shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x,landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-            right_hip = [landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].x,landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].y]
-            left_hip = [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x,landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-            right_knee = [landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].x,landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].y]
-            left_knee = [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x,landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-            right_ankle = [landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].x,landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].y]
-            left_ankle = [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x,landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-                        
-            #calculate (shoulder-hip-knee)
-            right_angle = calculate_angle(right_shoulder, right_hip, right_knee)
-            left_angle = calculate_angle(left_shoulder, left_hip, left_knee)
-            #calculate (hip-knee-ankle)
-            right_angle_leg = calculate_angle(right_hip, right_knee, right_ankle)
-            left_angle_leg = calculate_angle(left_hip, left_knee, left_ankle)
-            
-            
-            if calculate_Y_diff_abs(right_shoulder, right_hip)<0.05 or calculate_Y_diff_abs(left_shoulder, left_hip)<0.05:
-                motion = "lie"
-            else:
-                    
-                if (right_angle>140 and (left_angle>70 and left_angle<=140)) or (left_angle>140 and (right_angle>70 and right_angle<=140)): 
-                    motion = "sit"
-                    
-                elif (right_angle>140 and left_angle<75) or (left_angle>140 and right_angle<75): 
-                    motion = "sit"
-                    
-                elif ((right_angle>70 and right_angle<=140)and(left_angle<=75)) or ((left_angle>70 and left_angle<=140)and(right_angle<=75)): 
+        #calculate (shoulder-hip-knee)
+        right_angle = features[RIGHT_HIP_ANGLE]
+        left_angle = features[LEFT_HIP_ANGLE]
+        #calculate (hip-knee-ankle)
+        right_angle_leg = features[RIGHT_KNEE_ANGLE]
+        left_angle_leg = features[LEFT_KNEE_ANGLE]
+        
+        
+        if abs(features[RIGHT_SHOULDER_HIP_DY])<0.05 or abs(features[LEFT_SHOULDER_HIP_DY])<0.05:
+            motion = "lie"
+        else:
+                
+            if (right_angle>140 and (left_angle>70 and left_angle<=140)) or (left_angle>140 and (right_angle>70 and right_angle<=140)): 
+                motion = "sit"
+                
+            elif (right_angle>140 and left_angle<75) or (left_angle>140 and right_angle<75): 
+                motion = "sit"
+                
+            elif ((right_angle>70 and right_angle<=140)and(left_angle<=75)) or ((left_angle>70 and left_angle<=140)and(right_angle<=75)): 
+                motion = "sit"
+                            
+            elif (right_angle>70 and right_angle<=140) and (left_angle>70 and left_angle<=140): 
+                if features[RIGHT_KNEE_HIP_DY]<=0.1:
                     motion = "sit"
-                                
-                elif (right_angle>70 and right_angle<=140) and (left_angle>70 and left_angle<=140): 
-                    if calculate_Y_diff(right_knee, right_hip)<=0.1:
-                        motion = "sit"
-                    else:
-                        motion = "stand"
-                        
-                elif right_angle>140 and left_angle>140:
+                else:
                     motion = "stand"
                     
-                elif right_angle<=100 and left_angle<=100: 
-                    if calculate_Y_diff(right_knee, right_hip)<=0.1 or calculate_Y_diff(left_knee, left_hip)<=0.1:
-                        motion = "sit"              
-        except:
-            pass
+            elif right_angle>140 and left_angle>140:
+                motion = "stand"
+                
+            elif right_angle<=100 and left_angle<=100: 
+                if features[RIGHT_KNEE_HIP_DY]<=0.1 or features[LEFT_KNEE_HIP_DY]<=0.1:
+                    motion = "sit"              
+    except:
+        pass
 
 
-    
-    
-    
-    
-        # 동작1 sit
-        if motion == "stand": #마지막에 sit으로 바꾸자
-                    #img load
-            img = cv2.imread("temp.png")
-            #img = cv2.resize(img, None, fx=0.4, fy=0.4)
-            height, width, channels = img.shape
-
-            blob = cv2.dnn.blobFromImage(img, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
-            net.setInput(blob)
-            outs = net.forward(output_layers)
-
-            class_ids = []
-            confidences = []
-            boxes = []
-            
-            for out in outs:
-                for detection in out:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-
-                    if confidence > 0.5:
-                        center_x = int(detection[0] * width)
-                        center_y = int(detection[1] * height)
-                        w = int(detection[2] * width)
-                        h = int(detection[3] * height)
-
-                        x = int(center_x - w / 2)
-                        y = int(center_y - h / 2)
-                        boxes.append([x, y, w, h])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
-
-            class_in = []
-            box = []
-            
 
-            indexes = cv2.dnn.NMSBoxes(boxes, confidences, 0.1, 0.4)
 
-            font = cv2.FONT_HERSHEY_PLAIN
+
+
+    # 동작1 sit
+    if motion == "stand": #마지막에 sit으로 바꾸자
+        #img load
+        img = frame.bgr
+        height, width, channels = frame.shape
+
+        blob = cv2.dnn.blobFromImage(img, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
+        net.setInput(blob)
+        outs = net.forward(output_layers)
+
+        #출력 텐서 전체를 한 번에 디코딩
+        detections = decode_outputs(outs, width, height)
+        boxes = detections.boxes
+        confidences = detections.scores
+        class_ids = detections.class_ids
+
+        class_in = []
+        box = []
+        
+
+        indexes = nms(detections)
+
+        
+        meal_cnt = 0
+        media_cnt = 0
+        work_cnt = 0
+        present = []
+        
+        #NMS 로 남은 검출만 바로 인덱싱
+        for i in indexes:
+            x, y, w, h = boxes[i]
+            label = str(classes[class_ids[i]])
             
-            meal_cnt = 0
-            media_cnt = 0
-            work_cnt = 0
-            present = []
+            present.append(label)
             
-            for i in range(len(boxes)):
+            print(f"class_ids: {label} x : {x} y : {y}")
+            box.append(boxes[i])
+
+        snapshot.write(frame, box, present, colors)
+   
+        #--------------------------------------------------------------------------        
                 
-                if i in indexes:
-                    x, y, w, h = boxes[i]
-                    label = str(classes[class_ids[i]])
-                    
-                    present.append(label)
-                    
-                    print(f"class_ids: {label} x : {x} y : {y}")
-                    color = colors[i]
-                    cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
-                    cv2.putText(img, label, (x, y+30), font, 2, color, 2)
-       
-            #--------------------------------------------------------------------------        
-                    
-                    
-                    
-                    
-                    
-                    
-                    
-                    
-                    
-            #변화 없으면    
-            if present == past:
                 
-                #3턴째 변화 없으면
-                if state_cnt >= 3:
-                    print("NO DIFFERENCE")
-                    print("============================")
-                    #다시 처음부터
-                    continue
                 
-                #아직 3턴 아니면
-                state_cnt += 1
-                #그냥 현재걸로 계산
-                #result = present
-                    
-                    
-                    
-                    
-                    
-                    
                 
-            #변화 있으면    
-            else:    
-                state_cnt = 0
                 
-                #새로 생긴걸로 계산
-                result = list(set(present) - set(past))
                 
-                if len(past) > len(present):
-                    result = present
                 
                 
                 
+        #변화 없으면    
+        if present == past:
+            
+            #3턴째 변화 없으면
+            if state_cnt >= 3:
+                print("NO DIFFERENCE")
+                print("============================")
+                #다시 처음부터
+                continue
+            
+            #아직 3턴 아니면
+            state_cnt += 1
+            #그냥 현재걸로 계산
+            #result = present
+                
+                
                 
                 
                 
-            
-            time.sleep(0.2)
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            print("----------")
-            print("state_cnt : ")
-            print(state_cnt)
-            print("present : ")
-            print(present)
-            print("past : ")
-            print(past)
-            print("result : ")
-            print(result)
-            print("----------")
-            
-            for i in range(len(result)):
                 
-                if result[i] in meal_con:
-                    meal_cnt += 1
-                    
-                elif result[i] in media_con:
-                    media_cnt += 1
-                    
-                elif result[i] in work_con:
-                    work_cnt += 1
-                    
-                else:
-                    pass
-            
-            
-            
-            print("meal : " + str(meal_cnt))
-            print("media : " + str(media_cnt))
-            print("work : " +str(work_cnt))
             
+        #변화 있으면    
+        else:    
+            state_cnt = 0
             
+            #새로 생긴걸로 계산
+            result = list(set(present) - set(past))
             
+            if len(past) > len(present):
+                result = present
             
             
             
             
             
             
-            max_cnt = ""
+        
+        time.sleep(0.2)
+        
+        
+        
+        
+        
+        
+        
+        
+        
+        
+        print("----------")
+        print("state_cnt : ")
+        print(state_cnt)
+        print("present : ")
+        print(present)
+        print("past : ")
+        print(past)
+        print("result : ")
+        print(result)
+        print("----------")
+        
+        for i in range(len(result)):
             
-            if meal_cnt > media_cnt:
+            if result[i] in meal_con:
+                meal_cnt += 1
                 
-                if meal_cnt > work_cnt:
-                    max_cnt = "meal"
-                    
-            elif meal_cnt < media_cnt:
+            elif result[i] in media_con:
+                media_cnt += 1
                 
-                if media_cnt > work_cnt:
-                    max_cnt = "media"
-                    
-                if media_cnt < work_cnt:
-                    max_cnt = "work"
-                    
-            elif meal_cnt == media_cnt == work_cnt:
-                max_cnt = ""
-     
-            print("max : " + max_cnt)
-     
-     
-            #-------------------------------------------------------------------------- 
-     
-
-            if max_cnt == "meal":
-                NOW.insert(0, "meal")
-                            
-            elif max_cnt == "work":
-                    NOW.insert(0, "work")
-                
-            elif max_cnt == "media":
-                NOW.insert(0, "media")
+            elif result[i] in work_con:
+                work_cnt += 1
                 
             else:
                 pass
-                      
+        
+        
+        
+        print("meal : " + str(meal_cnt))
+        print("media : " + str(media_cnt))
+        print("work : " +str(work_cnt))
+        
+        
+        
+        
+        
+        
+        
+        
+        
+        max_cnt = ""
+        
+        if meal_cnt > media_cnt:
+            
+            if meal_cnt > work_cnt:
+                max_cnt = "meal"
+                
+        elif meal_cnt < media_cnt:
+            
+            if media_cnt > work_cnt:
+                max_cnt = "media"
+                
+            if media_cnt < work_cnt:
+                max_cnt = "work"
+                
+        elif meal_cnt == media_cnt == work_cnt:
+            max_cnt = ""
+ 
+        print("max : " + max_cnt)
+ 
+ 
+        #-------------------------------------------------------------------------- 
+ 
 
+        if max_cnt == "meal":
+            NOW.push("meal")
+                        
+        elif max_cnt == "work":
+                NOW.push("work")
+            
+        elif max_cnt == "media":
+            NOW.push("media")
+            
+        else:
+            pass
+                  
 
 
 
@@ -386,64 +340,53 @@ while temp.isOpened():
 
 
 
-        #동작2 lie -> sleep
-        elif motion == "lie":
-            NOW.insert(0, "sleep")
 
+    #동작2 lie -> sleep
+    elif motion == "lie":
+        NOW.push("sleep")
+
+
+    #동작3 stand -> 전 상태 유지
+    else:
+        print("wait => " + stage["CurrentMoment"])
+
+        
 
-        #동작3 stand -> 전 상태 유지
-        else:
-            print("wait => " + stage["CurrentMoment"])
 
-            
 
-        #사진 삭제
-        os.remove("temp.png")
- 
-    
-    
-    
-        time.sleep(0.2)
 
+    time.sleep(0.2)
+
+
+
+                
+    #오래된 표는 push 할 때 자동으로 빠짐
+    print("NOW : ")
+    print(list(NOW))
 
     
-                    
-        if(len(NOW) > 3):
-            print("pop")
-            NOW.pop()       
-        print("NOW : ")
-        print(NOW)
+    if NOW.winner is not None:
+        stage["CurrentMoment"] = NOW.winner
+        
+        
 
         
-        if(NOW.count("work")  == 3):
-            stage["CurrentMoment"] = "work"
-            
-        elif(NOW.count("media")  == 3):
-            stage["CurrentMoment"] = "media"
-            
-        elif(NOW.count("meal")  == 3):
-            stage["CurrentMoment"] = "meal"
-            
-        elif(NOW.count("sleep")  == 3):
-            stage["CurrentMoment"] = "sleep"
-            
-            
+    print("motion : " + motion)
+    print("CurrentMoment : " + stage["CurrentMoment"])
+
     
+    meal_check = 0
+    score_con = 0
+    stage["CurrentMoment"] = "initial"        
             
-        print("motion : " + motion)
-        print("CurrentMoment : " + stage["CurrentMoment"])
+    print("-------------------------------------------------")
+            
+    past = present
 
-        
-        meal_check = 0
-        score_con = 0
-        stage["CurrentMoment"] = "initial"        
-                
-        print("-------------------------------------------------")
-                
-        past = present
+    time.sleep(0.2)
 
-        time.sleep(0.2)
-    
 #client_socket.close()  # 클라이언트 소켓 종료
     
-    
\ No newline at end of file
+    
+capture.stop()
+pose.close()